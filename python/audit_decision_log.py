@@ -0,0 +1,68 @@
+import argparse
+import logging
+import os
+
+from dotenv import load_dotenv
+from google.protobuf import json_format
+
+from kiorga.storage.decision_log_store import DecisionLogStore
+
+# Lädt die Umgebungsvariablen aus der .env-Datei im Root-Verzeichnis
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def _store_directories(directory: str) -> list[str]:
+    """
+    Liefert die Store-Verzeichnisse unter `directory`.
+
+    Der SDA-BE schreibt pro Worker in ein eigenes Unterverzeichnis (`worker-<n>`);
+    enthält `directory` selbst Segmente, ist es ein einzelner Store.
+    """
+    if any(name.startswith("segment-") or name == "LOCK" for name in os.listdir(directory)):
+        return [directory]
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if os.path.isdir(os.path.join(directory, name))
+    )
+
+
+def audit(directory: str, task_id: str | None, query: str | None, limit: int | None) -> None:
+    """
+    Gibt die Entscheidungen eines Tasks oder die Treffer einer Volltextsuche als JSON-Zeilen aus.
+
+    Die Stores werden nur lesend geöffnet und können daher parallel zum laufenden
+    Agenten ausgewertet werden. Treffer mehrerer Worker werden nach `logged_at` sortiert.
+    """
+    decisions = []
+    for store_directory in _store_directories(directory):
+        try:
+            with DecisionLogStore(store_directory, read_only=True) as store:
+                if query:
+                    decisions.extend(store.search(query, task_id=task_id))
+                else:
+                    decisions.extend(store.get_task_history(task_id))
+        except IOError as e:
+            logging.error(f"Store {store_directory} konnte nicht gelesen werden: {e}")
+
+    decisions.sort(key=lambda decision: (decision.logged_at.seconds, decision.logged_at.nanos))
+    for decision in decisions[:limit]:
+        print(json_format.MessageToJson(decision, indent=None))
+    logging.info(f"{min(len(decisions), limit or len(decisions))} von {len(decisions)} Entscheidungen ausgegeben.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audit der lokal protokollierten DecisionLogs.")
+    parser.add_argument("--dir", default=os.getenv("DECISION_LOG_DIR"), help="Verzeichnis des DecisionLogStores (Standard: DECISION_LOG_DIR)")
+    parser.add_argument("--task-id", help="Nur Entscheidungen dieses Tasks")
+    parser.add_argument("--search", help="Volltextsuche über Entscheidung, Begründung und Alternativen")
+    parser.add_argument("--limit", type=int, help="Maximale Anzahl ausgegebener Entscheidungen")
+    args = parser.parse_args()
+
+    if not args.dir:
+        parser.error("--dir oder DECISION_LOG_DIR muss gesetzt sein")
+    if not args.task_id and not args.search:
+        parser.error("--task-id und/oder --search angeben")
+    audit(args.dir, args.task_id, args.search, args.limit)
@@ -0,0 +1,75 @@
+"""
+Vergleicht die vorberechneten Firestore-Konverter mit json_format.MessageToDict/ParseDict.
+
+Aufruf (aus dem Verzeichnis `python/`):
+    python -m benchmarks.firestore_converters_benchmark
+"""
+import timeit
+import uuid
+
+from google.protobuf import json_format
+from google.protobuf.timestamp_pb2 import Timestamp
+
+from kiorga.datamodel import task_pb2, test_result_report_pb2
+from kiorga.utils.firestore_converters import get_converter
+
+ITERATIONS = 20000
+
+
+def _build_task() -> task_pb2.Task:
+    now = Timestamp()
+    now.GetCurrentTime()
+    task = task_pb2.Task(
+        task_id=str(uuid.uuid4()),
+        title="Benchmark-Task",
+        description="Task mit typischer Feldbelegung für den Konverter-Benchmark.",
+        status=task_pb2.TaskStatus.TASK_STATUS_PENDING,
+        priority=task_pb2.TaskPriority.TASK_PRIORITY_HIGH,
+        creator_agent_id="benchmark",
+        dependencies=[str(uuid.uuid4()) for _ in range(3)],
+        input_data_references={"spec": "gs://bucket/spec.md", "repo": "gs://bucket/repo.zip"},
+        success_criteria_metrics="Alle Tests grün.",
+    )
+    task.created_at.CopyFrom(now)
+    task.due_date.CopyFrom(now)
+    return task
+
+
+def _build_report() -> test_result_report_pb2.TestResultReport:
+    report = test_result_report_pb2.TestResultReport(
+        report_id=str(uuid.uuid4()),
+        task_id=str(uuid.uuid4()),
+        overall_status=test_result_report_pb2.TestRunStatus.TEST_RUN_STATUS_PASSED,
+        total_tests_run=20,
+        total_tests_passed=20,
+    )
+    report.execution_timestamp.GetCurrentTime()
+    for i in range(20):
+        case = report.test_cases.add(test_name=f"test_case_{i}", passed=True)
+        case.duration.FromMilliseconds(150 + i)
+    return report
+
+
+def _compare(label: str, message) -> None:
+    message_class = type(message)
+    converter = get_converter(message_class)
+    json_dict = json_format.MessageToDict(message)
+    firestore_dict = converter.to_firestore(message)
+
+    results = {
+        "MessageToDict": timeit.timeit(lambda: json_format.MessageToDict(message), number=ITERATIONS),
+        "to_firestore": timeit.timeit(lambda: converter.to_firestore(message), number=ITERATIONS),
+        "ParseDict": timeit.timeit(lambda: json_format.ParseDict(json_dict, message_class()), number=ITERATIONS),
+        "from_firestore": timeit.timeit(lambda: converter.from_firestore(firestore_dict), number=ITERATIONS),
+    }
+
+    print(f"\n{label} ({ITERATIONS} Iterationen)")
+    for name, seconds in results.items():
+        print(f"  {name:<15} {seconds * 1e6 / ITERATIONS:8.2f} µs/op")
+    print(f"  Speedup schreiben: {results['MessageToDict'] / results['to_firestore']:.1f}x")
+    print(f"  Speedup lesen:     {results['ParseDict'] / results['from_firestore']:.1f}x")
+
+
+if __name__ == "__main__":
+    _compare("Task", _build_task())
+    _compare("TestResultReport", _build_report())
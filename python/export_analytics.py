@@ -0,0 +1,140 @@
+import argparse
+import logging
+import os
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from google.cloud import firestore
+
+from kiorga.analytics.columnar_export import (
+    FEEDBACK_SCHEMA,
+    TEST_CASE_SCHEMA,
+    exported_ids,
+    feedback_exporter,
+    flake_rates,
+    high_water_mark,
+    rating_distribution_per_agent,
+    slowest_tests,
+    test_result_exporter,
+)
+from kiorga.datamodel import feedback_log_pb2, test_result_report_pb2
+from kiorga.utils.firestore_converters import message_from_firestore
+
+# Lädt die Umgebungsvariablen aus der .env-Datei im Root-Verzeichnis
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# --- Konfiguration ---
+TEST_REPORTS_COLLECTION = os.getenv("COLLECTION_TEST_RESULT_REPORTS", "test_result_reports")
+FEEDBACK_COLLECTION = os.getenv("COLLECTION_FEEDBACK_LOGS", "feedback_logs")
+# Zeitfenster vor der High-Water-Mark, das erneut gelesen wird, um verspätet
+# geschriebene Dokumente mit älterem Zeitstempel noch zu erfassen.
+DEFAULT_LOOKBACK_SECONDS = int(os.getenv("ANALYTICS_EXPORT_LOOKBACK_SECONDS", "3600"))
+# ---------------------
+
+
+def _stream_messages(query, message_class, id_field: str, skip_ids: set[str]):
+    """
+    Liest eine Firestore-Abfrage als Stream und konvertiert jedes Dokument in eine Nachricht.
+
+    Nachrichten, deren ID (`id_field`) in `skip_ids` enthalten ist, werden übersprungen.
+    """
+    for snapshot in query.stream():
+        message = message_from_firestore(snapshot.to_dict(), message_class)
+        if getattr(message, id_field) not in skip_ids:
+            yield message
+
+
+def _incremental_query(db, collection: str, timestamp_field: str, since: datetime | None):
+    query = db.collection(collection).order_by(timestamp_field)
+    if since:
+        query = query.where(filter=firestore.FieldFilter(timestamp_field, ">=", since))
+    return query
+
+
+def _resume_point(dataset_path: str, schema, id_column: str, timestamp_column: str, since: datetime | None, lookback: timedelta):
+    """Ermittelt Startzeitpunkt und die dort bereits exportierten IDs eines Datasets."""
+    if since is None:
+        mark = high_water_mark(dataset_path, schema, timestamp_column)
+        since = mark - lookback if mark else None
+    skip_ids = exported_ids(dataset_path, schema, id_column, timestamp_column, since) if since else set()
+    return since, skip_ids
+
+
+def export(output_dir: str, since: str | None, lookback_seconds: int = DEFAULT_LOOKBACK_SECONDS) -> None:
+    """
+    Exportiert TestResultReports und FeedbackLogs aus Firestore in Parquet-Datasets.
+
+    Jeder Lauf hängt neue Dateien an die bestehenden Datasets an. Ohne `since` wird ab dem
+    neuesten Zeitstempel im jeweiligen Dataset (High-Water-Mark) abzüglich
+    `lookback_seconds` gelesen (einschließlich); Dokumente, deren ID ab diesem Zeitpunkt
+    bereits im Dataset steht, werden übersprungen. Wiederholte Läufe erzeugen daher keine
+    Duplikate, und Dokumente mit demselben Zeitstempel wie die Grenze gehen nicht verloren.
+    Ein explizites `since` (ISO-Zeitpunkt) ersetzt die High-Water-Mark für beide Datasets.
+
+    Einschränkung: Die Zeitstempel (`executionTimestamp`, `submittedAt`) setzt der
+    Erzeuger, nicht Firestore. Ein Dokument, das erst nach einem Export geschrieben wird
+    und einen Zeitstempel älter als High-Water-Mark minus `lookback_seconds` trägt, wird
+    nie exportiert; in diesem Fall mit einem passenden `since` nachexportieren.
+    """
+    db = firestore.Client()
+    since_override = datetime.fromisoformat(since) if since else None
+    lookback = timedelta(seconds=lookback_seconds)
+
+    test_cases_path = os.path.join(output_dir, "test_cases")
+    test_since, test_skip_ids = _resume_point(
+        test_cases_path, TEST_CASE_SCHEMA, "report_id", "execution_timestamp", since_override, lookback
+    )
+    logging.info(f"Exportiere TestResultReports ab {test_since or 'Beginn'} ({len(test_skip_ids)} bereits exportiert).")
+    with test_result_exporter(test_cases_path) as exporter:
+        query = _incremental_query(db, TEST_REPORTS_COLLECTION, "executionTimestamp", test_since)
+        count = exporter.extend(
+            _stream_messages(query, test_result_report_pb2.TestResultReport, "report_id", test_skip_ids)
+        )
+    logging.info(f"{count} TestResultReports exportiert.")
+
+    feedback_path = os.path.join(output_dir, "feedback")
+    feedback_since, feedback_skip_ids = _resume_point(
+        feedback_path, FEEDBACK_SCHEMA, "feedback_id", "submitted_at", since_override, lookback
+    )
+    logging.info(f"Exportiere FeedbackLogs ab {feedback_since or 'Beginn'} ({len(feedback_skip_ids)} bereits exportiert).")
+    with feedback_exporter(feedback_path) as exporter:
+        query = _incremental_query(db, FEEDBACK_COLLECTION, "submittedAt", feedback_since)
+        count = exporter.extend(_stream_messages(query, feedback_log_pb2.FeedbackLog, "feedback_id", feedback_skip_ids))
+    logging.info(f"{count} FeedbackLogs exportiert.")
+
+
+def report(output_dir: str) -> None:
+    """Gibt die Standardauswertungen über die exportierten Datasets aus."""
+    print("\nLangsamste Tests:")
+    print(slowest_tests(os.path.join(output_dir, "test_cases")))
+
+    print("\nFlake-Raten:")
+    print(flake_rates(os.path.join(output_dir, "test_cases")))
+
+    # Die Zuordnung Task -> Agent wird nur mit den benötigten Feldern gelesen.
+    db = firestore.Client()
+    tasks = db.collection("tasks").select(["taskId", "assignedToAgentId"]).stream()
+    agent_ids_by_task = {
+        data["taskId"]: data["assignedToAgentId"]
+        for data in (snapshot.to_dict() for snapshot in tasks)
+        if data.get("taskId") and data.get("assignedToAgentId")
+    }
+    print("\nRating-Verteilung pro Agent:")
+    print(rating_distribution_per_agent(os.path.join(output_dir, "feedback"), agent_ids_by_task))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analytics-Export für TestResultReports und FeedbackLogs.")
+    parser.add_argument("command", choices=["export", "report"])
+    parser.add_argument("--output-dir", default="analytics_export")
+    parser.add_argument("--since", help="ISO-Zeitpunkt; nur neuere Dokumente exportieren. Standard: neuester Zeitstempel im Dataset.")
+    parser.add_argument("--lookback-seconds", type=int, default=DEFAULT_LOOKBACK_SECONDS,
+                        help="Zeitfenster vor der High-Water-Mark, das erneut geprüft wird (verspätete Dokumente).")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export(args.output_dir, args.since, args.lookback_seconds)
+    else:
+        report(args.output_dir)
@@ -0,0 +1,56 @@
+# ===== Gunicorn-Konfiguration für den Multi-Worker-Betrieb aller Python-Services =====
+# Startet mehrere Uvicorn-Worker pro Container, damit Python-CPU-Arbeit (JSON-Parsing,
+# Konvertierung, Validierung) mit der Anzahl der vCPUs skaliert.
+#
+# Aufruf (im Service-Verzeichnis):
+# gunicorn -c /app/gunicorn.conf.py main:app
+#
+# Umgebungsvariablen:
+#   WEB_CONCURRENCY  Anzahl Worker (Standard: verfügbare vCPUs)
+#   PORT             Port (Standard: 8080)
+#   METRICS_DIR      Gemeinsames Verzeichnis für die Worker-Metriken
+#
+# Jeder Worker erhält in WORKER_SLOT einen stabilen Index (0..workers-1), den ein
+# neu gestarteter Worker von seinem beendeten Vorgänger übernimmt.
+import itertools
+import os
+import shutil
+import tempfile
+
+from kiorga.utils.process_model import available_cpus, metrics, setup_cloud_logging
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", available_cpus()))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 300
+
+# Die App wird einmal im Master geladen und per fork() an die Worker verteilt.
+# Das ist nur sicher, weil alle gRPC-Clients über PerProcess erst im Worker entstehen.
+preload_app = True
+
+# Muss vor dem Laden der App gesetzt sein, damit alle Worker dasselbe Verzeichnis erben.
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), "kiorga-metrics"))
+# Cloud Logging nicht im Master einrichten, sondern in jedem Worker (post_fork).
+os.environ["CLOUD_LOGGING_PER_WORKER"] = "1"
+
+
+def on_starting(server):
+    """Entfernt Metrik-Dateien eines früheren Laufs."""
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["METRICS_DIR"], exist_ok=True)
+
+
+def pre_fork(server, worker):
+    """Vergibt den kleinsten freien Slot; Slots beendeter Worker werden wiederverwendet."""
+    used = {getattr(other, "slot", None) for other in server.WORKERS.values()}
+    worker.slot = next(slot for slot in itertools.count() if slot not in used)
+
+
+def post_fork(server, worker):
+    os.environ["WORKER_SLOT"] = str(worker.slot)
+    setup_cloud_logging(force=True)
+
+
+def worker_exit(server, worker):
+    """Sichert den letzten Stand der Zähler eines beendeten Workers."""
+    metrics.flush()
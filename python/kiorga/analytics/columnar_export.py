@@ -0,0 +1,295 @@
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Iterable, Mapping, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from kiorga.datamodel import feedback_log_pb2, test_result_report_pb2
+
+# Ein Eintrag pro TestCaseResult; die Felder des Berichts werden denormalisiert,
+# damit Abfragen ohne Join auskommen.
+TEST_CASE_SCHEMA = pa.schema([
+    ("report_id", pa.string()),
+    ("task_id", pa.string()),
+    ("source_commit_id", pa.string()),
+    ("qaa_agent_id", pa.string()),
+    ("execution_timestamp", pa.timestamp("us", tz="UTC")),
+    ("overall_status", pa.int8()),
+    ("test_name", pa.string()),
+    ("passed", pa.bool_()),
+    ("duration_s", pa.float64()),
+])
+
+FEEDBACK_SCHEMA = pa.schema([
+    ("feedback_id", pa.string()),
+    ("submitted_at", pa.timestamp("us", tz="UTC")),
+    ("submitter_id", pa.int8()),
+    ("target_task_id", pa.string()),
+    ("rating", pa.int8()),
+])
+
+
+def _timestamp_micros(ts) -> Optional[int]:
+    if not ts.seconds and not ts.nanos:
+        return None
+    return ts.seconds * 1_000_000 + ts.nanos // 1000
+
+
+def _test_report_rows(report: test_result_report_pb2.TestResultReport) -> Iterable[tuple]:
+    executed_at = _timestamp_micros(report.execution_timestamp)
+    for case in report.test_cases:
+        yield (
+            report.report_id,
+            report.task_id,
+            report.source_commit_id,
+            report.qaa_agent_id,
+            executed_at,
+            report.overall_status,
+            case.test_name,
+            case.passed,
+            case.duration.seconds + case.duration.nanos / 1e9,
+        )
+
+
+def _feedback_rows(feedback: feedback_log_pb2.FeedbackLog) -> Iterable[tuple]:
+    yield (
+        feedback.feedback_id,
+        _timestamp_micros(feedback.submitted_at),
+        feedback.submitter_id,
+        feedback.target_task_id,
+        feedback.rating,
+    )
+
+
+class ColumnarExporter:
+    """
+    Schreibt Protobuf-Nachrichten gepuffert in ein Parquet-Dataset (ein Verzeichnis).
+
+    Jeder Flush erzeugt eine neue Parquet-Datei im Dataset-Verzeichnis. Dadurch ist das
+    Anhängen inkrementell: bestehende Dateien werden nie umgeschrieben, und Abfragen
+    über `pyarrow.dataset` sehen automatisch alle Teile.
+    """
+
+    def __init__(
+        self,
+        dataset_path: str,
+        schema: pa.Schema,
+        to_rows: Callable[[object], Iterable[tuple]],
+        batch_size: int = 100_000,
+    ):
+        """
+        Args:
+            dataset_path: Verzeichnis des Parquet-Datasets (wird bei Bedarf angelegt).
+            schema: Das Arrow-Schema der Zeilen.
+            to_rows: Funktion, die eine Nachricht in eine oder mehrere Zeilen zerlegt.
+            batch_size: Anzahl Zeilen, nach denen automatisch eine Datei geschrieben wird.
+        """
+        self.dataset_path = dataset_path
+        self.schema = schema
+        self.to_rows = to_rows
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self._rows = []
+
+    def append(self, message) -> None:
+        """Fügt eine Nachricht zum Puffer hinzu und schreibt bei vollem Puffer eine Datei."""
+        self._rows.extend(self.to_rows(message))
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def extend(self, messages: Iterable) -> int:
+        """Fügt beliebig viele Nachrichten hinzu (z.B. einen Firestore-Stream)."""
+        count = 0
+        for message in messages:
+            self.append(message)
+            count += 1
+        return count
+
+    def flush(self) -> Optional[str]:
+        """
+        Schreibt den Puffer als neue Parquet-Datei.
+
+        Returns:
+            Den Pfad der geschriebenen Datei oder `None`, wenn der Puffer leer war.
+
+        Raises:
+            IOError: Wenn die Datei nicht geschrieben werden kann.
+        """
+        if not self._rows:
+            return None
+
+        columns = list(zip(*self._rows))
+        table = pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        )
+        file_path = os.path.join(self.dataset_path, f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet")
+        try:
+            os.makedirs(self.dataset_path, exist_ok=True)
+            pq.write_table(table, file_path, compression="zstd")
+        except (OSError, pa.ArrowException) as e:
+            logging.error(f"Fehler beim Schreiben von {file_path}: {e}", exc_info=True)
+            raise IOError(f"could not write parquet file {file_path}") from e
+
+        self.rows_written += table.num_rows
+        self._rows = []
+        logging.info(f"{table.num_rows} Zeilen nach {file_path} exportiert.")
+        return file_path
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Bei einem Fehler wird der Puffer verworfen, damit keine halben Batches entstehen.
+        if exc_type is None:
+            self.close()
+
+
+def test_result_exporter(dataset_path: str, batch_size: int = 100_000) -> ColumnarExporter:
+    """Exporter für TestResultReports (eine Zeile pro TestCaseResult)."""
+    return ColumnarExporter(dataset_path, TEST_CASE_SCHEMA, _test_report_rows, batch_size)
+
+
+def feedback_exporter(dataset_path: str, batch_size: int = 100_000) -> ColumnarExporter:
+    """Exporter für FeedbackLogs (eine Zeile pro Feedback)."""
+    return ColumnarExporter(dataset_path, FEEDBACK_SCHEMA, _feedback_rows, batch_size)
+
+
+# === Vektorisierte Auswertungen ===
+
+def _load(dataset_path: str, schema: pa.Schema, columns: list, filter=None) -> pa.Table:
+    dataset = ds.dataset(dataset_path, format="parquet", schema=schema)
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+def high_water_mark(dataset_path: str, schema: pa.Schema, column: str) -> Optional[datetime]:
+    """
+    Ermittelt den neuesten Zeitstempel eines Datasets.
+
+    Dient als Startpunkt für inkrementelle Exporte: Da Exporte nach dem Zeitstempel
+    sortiert lesen, ist jedes Dokument bis zu diesem Zeitpunkt bereits exportiert.
+
+    Returns:
+        Den größten Wert der Spalte `column` oder `None` für ein leeres/fehlendes Dataset.
+    """
+    if not os.path.isdir(dataset_path):
+        return None
+    table = _load(dataset_path, schema, [column])
+    return pc.max(table[column]).as_py()
+
+
+def exported_ids(dataset_path: str, schema: pa.Schema, id_column: str, timestamp_column: str, since: datetime) -> set[str]:
+    """
+    Liefert die IDs aller Einträge mit Zeitstempel ab `since`.
+
+    Damit überspringt ein inkrementeller Export, der ab `since` (einschließlich) neu
+    liest, die bereits exportierten Dokumente.
+    """
+    if not os.path.isdir(dataset_path):
+        return set()
+    table = _load(dataset_path, schema, [id_column], filter=pc.field(timestamp_column) >= since)
+    return set(table[id_column].to_pylist())
+
+
+def slowest_tests(dataset_path: str, limit: int = 20) -> pa.Table:
+    """
+    Ermittelt die Testfälle mit der höchsten durchschnittlichen Laufzeit.
+
+    Returns:
+        Tabelle mit `test_name`, `runs`, `mean_duration_s`, `max_duration_s`,
+        absteigend nach `mean_duration_s` sortiert.
+    """
+    table = _load(dataset_path, TEST_CASE_SCHEMA, ["test_name", "duration_s"])
+    stats = table.group_by("test_name").aggregate([
+        ("duration_s", "count"),
+        ("duration_s", "mean"),
+        ("duration_s", "max"),
+    ]).rename_columns(["test_name", "runs", "mean_duration_s", "max_duration_s"])
+    return stats.sort_by([("mean_duration_s", "descending")]).slice(0, limit)
+
+
+def flake_rates(dataset_path: str, min_runs: int = 2) -> pa.Table:
+    """
+    Berechnet die Flake-Rate pro Testname.
+
+    Ein Test gilt für einen Commit als "flaky", wenn er auf demselben `source_commit_id`
+    sowohl bestanden als auch fehlgeschlagen ist. Die Flake-Rate ist der Anteil solcher
+    Commits an allen Commits, auf denen der Test mindestens `min_runs`-mal lief.
+
+    Returns:
+        Tabelle mit `test_name`, `commits`, `flaky_commits`, `flake_rate`, `failure_rate`,
+        absteigend nach `flake_rate` sortiert.
+    """
+    table = _load(dataset_path, TEST_CASE_SCHEMA, ["test_name", "source_commit_id", "passed"])
+    per_commit = table.group_by(["test_name", "source_commit_id"]).aggregate([
+        ("passed", "count"),
+        ("passed", "sum"),
+    ]).rename_columns(["test_name", "source_commit_id", "runs", "passes"])
+
+    per_commit = per_commit.filter(pc.greater_equal(per_commit["runs"], min_runs))
+    passes = per_commit["passes"]
+    flaky = pc.and_(pc.greater(passes, 0), pc.less(passes, per_commit["runs"]))
+    per_commit = per_commit.append_column("flaky", pc.cast(flaky, pa.int64()))
+    per_commit = per_commit.append_column("failures", pc.subtract(per_commit["runs"], passes))
+
+    stats = per_commit.group_by("test_name").aggregate([
+        ("source_commit_id", "count"),
+        ("flaky", "sum"),
+        ("runs", "sum"),
+        ("failures", "sum"),
+    ]).rename_columns(["test_name", "commits", "flaky_commits", "runs", "failures"])
+
+    stats = stats.append_column(
+        "flake_rate", pc.divide(pc.cast(stats["flaky_commits"], pa.float64()), stats["commits"])
+    ).append_column(
+        "failure_rate", pc.divide(pc.cast(stats["failures"], pa.float64()), stats["runs"])
+    )
+    return stats.select(["test_name", "commits", "flaky_commits", "flake_rate", "failure_rate"]).sort_by(
+        [("flake_rate", "descending"), ("test_name", "ascending")]
+    )
+
+
+def rating_distribution_per_agent(dataset_path: str, agent_ids_by_task: Mapping[str, str]) -> pa.Table:
+    """
+    Verteilung der Feedback-Ratings pro ausführendem Agenten.
+
+    FeedbackLogs referenzieren nur den Task; die Zuordnung Task -> Agent
+    (`Task.assigned_to_agent_id`) wird daher übergeben und per Hash-Join verknüpft.
+    Feedback ohne Rating (`FEEDBACK_RATING_UNSPECIFIED`) wird ignoriert.
+
+    Returns:
+        Tabelle mit `agent_id`, `rating`, `count`, `share` (Anteil innerhalb des Agenten).
+    """
+    feedback = _load(
+        dataset_path,
+        FEEDBACK_SCHEMA,
+        ["target_task_id", "rating"],
+        filter=pc.field("rating") != feedback_log_pb2.FeedbackRating.FEEDBACK_RATING_UNSPECIFIED,
+    )
+    assignments = pa.table({
+        "target_task_id": pa.array(list(agent_ids_by_task.keys()), type=pa.string()),
+        "agent_id": pa.array(list(agent_ids_by_task.values()), type=pa.string()),
+    })
+    joined = feedback.join(assignments, "target_task_id", join_type="inner")
+
+    counts = joined.group_by(["agent_id", "rating"]).aggregate([
+        ("rating", "count"),
+    ]).rename_columns(["agent_id", "rating", "count"])
+    totals = counts.group_by("agent_id").aggregate([
+        ("count", "sum"),
+    ]).rename_columns(["agent_id", "total"])
+
+    counts = counts.join(totals, "agent_id")
+    counts = counts.append_column("share", pc.divide(pc.cast(counts["count"], pa.float64()), counts["total"]))
+    return counts.select(["agent_id", "rating", "count", "share"]).sort_by(
+        [("agent_id", "ascending"), ("rating", "ascending")]
+    )
@@ -0,0 +1,449 @@
+import fcntl
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+from typing import Iterable, Optional
+
+from google.protobuf.message import DecodeError
+
+from kiorga.datamodel import decision_log_pb2
+
+# Record-Format: [Länge: uint32][CRC32 der Nutzdaten: uint32][serialisierter DecisionLog]
+_HEADER = struct.Struct(">II")
+_SEGMENT_PATTERN = re.compile(r"^segment-(\d{8})\.log$")
+_TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+# Sperrdatei, die den einzigen schreibenden Prozess eines Verzeichnisses kennzeichnet.
+_LOCK_FILE = "LOCK"
+
+
+def _segment_name(segment_id: int) -> str:
+    return f"segment-{segment_id:08d}.log"
+
+
+def tokenize(text: str) -> set[str]:
+    """Zerlegt Freitext in kleingeschriebene Terme für den invertierten Index."""
+    return {term.lower() for term in _TERM_PATTERN.findall(text)}
+
+
+def _decision_terms(decision: decision_log_pb2.DecisionLog) -> set[str]:
+    terms = tokenize(decision.decision) | tokenize(decision.reasoning)
+    for alternative in decision.alternatives_considered:
+        terms |= tokenize(alternative)
+    return terms
+
+
+class DecisionLogStore:
+    """
+    Append-only Speicher für DecisionLogs in Segmentdateien auf dem lokalen Dateisystem.
+
+    Jeder Eintrag wird als längenpräfixierter Binär-Record an das aktive Segment angehängt.
+    Im Speicher werden drei Indizes gehalten:
+
+    - `decision_id` -> Position (Segment, Offset, Länge)
+    - `task_id` -> `decision_id`s in Schreibreihenfolge
+    - Term -> `decision_id`s (invertierter Index über `decision`, `reasoning`
+      und `alternatives_considered`)
+
+    Gelesen wird über memory-mapped Segmente. Die Indizes werden beim Öffnen durch einen
+    sequentiellen Scan der Segmente aufgebaut; ein unvollständiger Record am Ende (Absturz
+    während des Schreibens) wird abgeschnitten.
+
+    Pro Verzeichnis darf nur ein Store schreiben; er hält dazu eine exklusive `flock`-Sperre
+    auf der Datei `LOCK`. Mit `read_only=True` kann ein Store, in den ein anderer Prozess schreibt, für Audits
+    geöffnet werden: Es wird nichts gekürzt, geschrieben oder kompaktiert, und die Indizes
+    spiegeln den Stand beim Öffnen wider.
+
+    Wird derselbe `decision_id` erneut geschrieben (z.B. durch Pub/Sub-Redelivery), gilt
+    der zuletzt geschriebene Eintrag. Die Kompaktierung fasst abgeschlossene Segmente
+    zusammen und entfernt dabei überholte Einträge.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        fsync: bool = False,
+        compaction_interval: Optional[float] = None,
+        compaction_min_segments: int = 4,
+        read_only: bool = False,
+    ):
+        """
+        Args:
+            directory: Verzeichnis der Segmentdateien (wird bei Bedarf angelegt).
+            max_segment_bytes: Größe, ab der ein neues Segment begonnen wird.
+            fsync: Wenn `True`, wird nach jedem Schreibvorgang zusätzlich `os.fsync`
+                   aufgerufen. Ohne fsync überstehen geschriebene Einträge einen
+                   Prozessabbruch (z.B. SIGKILL), aber keinen Absturz des Betriebssystems.
+            compaction_interval: Intervall in Sekunden für die Hintergrund-Kompaktierung.
+                                 `None` deaktiviert den Hintergrund-Thread.
+            compaction_min_segments: Mindestanzahl abgeschlossener Segmente für eine
+                                     Kompaktierung im Hintergrund.
+            read_only: Öffnet den Store nur zum Lesen, z.B. parallel zum schreibenden Agenten.
+
+        Raises:
+            IOError: Wenn `read_only` gesetzt ist und das Verzeichnis nicht existiert, oder
+                     wenn bereits ein anderer Store in das Verzeichnis schreibt.
+        """
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync = fsync
+        self.compaction_min_segments = compaction_min_segments
+        self.read_only = read_only
+
+        self._lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+        self._locations: dict[str, tuple[int, int, int]] = {}
+        self._by_task: dict[str, dict[str, None]] = {}
+        self._by_term: dict[str, set[str]] = {}
+        self._maps: dict[int, mmap.mmap] = {}
+        self._record_counts: dict[int, int] = {}
+        self._segments: list[int] = []
+        self._active_file = None
+        self._active_id = 0
+        self._active_size = 0
+        self._lock_file = None
+
+        if read_only:
+            if not os.path.isdir(directory):
+                raise IOError(f"decision log directory {directory} does not exist")
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self._acquire_writer_lock()
+        self._load()
+
+        self._stop = threading.Event()
+        self._compactor = None
+        if compaction_interval and not read_only:
+            self._compactor = threading.Thread(
+                target=self._compaction_loop, args=(compaction_interval,), daemon=True
+            )
+            self._compactor.start()
+
+    # === Öffnen & Wiederherstellung ===
+
+    def _acquire_writer_lock(self) -> None:
+        # Zwei Schreiber auf demselben Verzeichnis würden gegenseitig ihre Offsets und
+        # Indizes ungültig machen (z.B. mehrere Instanzen auf einem gemeinsamen Mount).
+        path = os.path.join(self.directory, _LOCK_FILE)
+        lock_file = open(path, "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            lock_file.close()
+            raise IOError(f"decision log directory {self.directory} is already opened for writing") from e
+        self._lock_file = lock_file
+
+    def _load(self) -> None:
+        segment_ids = sorted(
+            int(match.group(1))
+            for match in map(_SEGMENT_PATTERN.match, os.listdir(self.directory))
+            if match
+        )
+        for segment_id in segment_ids:
+            valid_size = self._index_segment(segment_id)
+            path = self._path(segment_id)
+            if self.read_only:
+                # Ein unvollständiger Record kann ein laufender Schreibvorgang sein.
+                continue
+            if valid_size < os.path.getsize(path):
+                logging.warning(f"Segment {path} enthält einen unvollständigen Record. Kürze auf {valid_size} Bytes.")
+                with open(path, "r+b") as f:
+                    f.truncate(valid_size)
+        self._segments = segment_ids
+
+        if self.read_only:
+            self._active_id = segment_ids[-1] if segment_ids else 0
+        elif segment_ids and os.path.getsize(self._path(segment_ids[-1])) < self.max_segment_bytes:
+            self._open_active(segment_ids[-1])
+        else:
+            self._open_active((segment_ids[-1] + 1) if segment_ids else 1)
+
+        logging.info(f"DecisionLogStore geladen: {len(self._locations)} Einträge in {len(self._segments)} Segmenten.")
+
+    def _index_segment(self, segment_id: int) -> int:
+        """Indiziert alle gültigen Records eines Segments und gibt die gültige Länge zurück."""
+        path = self._path(segment_id)
+        if os.path.getsize(path) == 0:
+            return 0
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            size = len(data)
+            while offset + _HEADER.size <= size:
+                length, checksum = _HEADER.unpack_from(data, offset)
+                start = offset + _HEADER.size
+                payload = data[start:start + length]
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    break
+                decision = decision_log_pb2.DecisionLog.FromString(payload)
+                self._index(decision, (segment_id, start, length))
+                offset = start + length
+            return offset
+
+    def _open_active(self, segment_id: int) -> None:
+        self._active_file = open(self._path(segment_id), "ab")
+        self._active_id = segment_id
+        self._active_size = self._active_file.tell()
+        if segment_id not in self._segments:
+            self._segments.append(segment_id)
+
+    def _path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, _segment_name(segment_id))
+
+    # === Schreiben ===
+
+    def append(self, decision: decision_log_pb2.DecisionLog) -> None:
+        """
+        Hängt einen DecisionLog an das aktive Segment an und aktualisiert die Indizes.
+
+        Raises:
+            ValueError: Wenn `decision_id` oder `task_id` fehlen.
+            IOError: Wenn der Record nicht geschrieben werden kann.
+        """
+        self.append_many([decision])
+
+    def append_many(self, decisions: Iterable[decision_log_pb2.DecisionLog]) -> int:
+        """
+        Hängt mehrere DecisionLogs mit einem einzigen Schreibvorgang pro Segment an.
+
+        Returns:
+            Die Anzahl der geschriebenen Einträge.
+        """
+        if self.read_only:
+            raise IOError("decision log store is read-only")
+        count = 0
+        with self._lock:
+            buffer = bytearray()
+            pending = []
+            for decision in decisions:
+                if not decision.decision_id or not decision.task_id:
+                    raise ValueError("DecisionLog benötigt decision_id und task_id")
+                payload = decision.SerializeToString()
+                if buffer and self._active_size + len(buffer) + _HEADER.size + len(payload) > self.max_segment_bytes:
+                    self._write(buffer, pending)
+                    buffer, pending = bytearray(), []
+                    self._rotate()
+                elif not buffer and self._active_size and self._active_size + _HEADER.size + len(payload) > self.max_segment_bytes:
+                    self._rotate()
+                start = self._active_size + len(buffer) + _HEADER.size
+                buffer += _HEADER.pack(len(payload), zlib.crc32(payload))
+                buffer += payload
+                pending.append((decision, (self._active_id, start, len(payload))))
+                count += 1
+            if buffer:
+                self._write(buffer, pending)
+        return count
+
+    def _write(self, buffer: bytearray, pending: list) -> None:
+        try:
+            self._active_file.write(buffer)
+            # Sofort an das Betriebssystem übergeben: Der Prozess kann jederzeit ohne
+            # close() beendet werden (Worker-Timeout, Shutdown der Instanz).
+            self._active_file.flush()
+            if self.fsync:
+                os.fsync(self._active_file.fileno())
+        except OSError as e:
+            logging.error(f"Fehler beim Schreiben in Segment {self._active_id}: {e}", exc_info=True)
+            raise IOError("decision log write error") from e
+        self._active_size += len(buffer)
+        for decision, location in pending:
+            self._index(decision, location)
+
+    def _rotate(self) -> None:
+        self._active_file.close()
+        self._open_active(self._active_id + 1)
+
+    def _index(self, decision: decision_log_pb2.DecisionLog, location: tuple[int, int, int]) -> None:
+        decision_id = decision.decision_id
+        if decision_id in self._locations:
+            # Überholten Eintrag aus dem Term-Index entfernen (selten, z.B. bei Redelivery).
+            previous = self._read(self._locations[decision_id])
+            for term in _decision_terms(previous):
+                postings = self._by_term.get(term)
+                if postings is not None:
+                    postings.discard(decision_id)
+            if previous.task_id != decision.task_id:
+                self._by_task.get(previous.task_id, {}).pop(decision_id, None)
+
+        self._locations[decision_id] = location
+        self._record_counts[location[0]] = self._record_counts.get(location[0], 0) + 1
+        self._by_task.setdefault(decision.task_id, {})[decision_id] = None
+        for term in _decision_terms(decision):
+            self._by_term.setdefault(term, set()).add(decision_id)
+
+    def flush(self) -> None:
+        """Schreibt gepufferte Daten des aktiven Segments in die Datei."""
+        with self._lock:
+            if self._active_file is not None:
+                self._active_file.flush()
+
+    # === Lesen ===
+
+    def _read(self, location: tuple[int, int, int]) -> decision_log_pb2.DecisionLog:
+        try:
+            return decision_log_pb2.DecisionLog.FromString(self._raw(location))
+        except (DecodeError, OSError, ValueError) as e:
+            raise IOError(f"could not read decision log record at {location}") from e
+
+    def _raw(self, location: tuple[int, int, int]) -> bytes:
+        segment_id, offset, length = location
+        data = self._maps.get(segment_id)
+        if data is None or len(data) < offset + length:
+            # Neues oder gewachsenes Segment: (neu) mappen.
+            if data is not None:
+                data.close()
+            with open(self._path(segment_id), "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment_id] = data
+        return data[offset:offset + length]
+
+    def get(self, decision_id: str) -> Optional[decision_log_pb2.DecisionLog]:
+        """Liest einen einzelnen DecisionLog anhand seiner ID."""
+        with self._lock:
+            location = self._locations.get(decision_id)
+            return self._read(location) if location else None
+
+    def get_task_history(self, task_id: str) -> list[decision_log_pb2.DecisionLog]:
+        """Liefert alle Entscheidungen eines Tasks in der Reihenfolge, in der sie geloggt wurden."""
+        with self._lock:
+            decision_ids = self._by_task.get(task_id, {})
+            return [self._read(self._locations[decision_id]) for decision_id in decision_ids]
+
+    def search(self, query: str, task_id: Optional[str] = None, limit: Optional[int] = None) -> list[decision_log_pb2.DecisionLog]:
+        """
+        Volltextsuche über `decision`, `reasoning` und `alternatives_considered`.
+
+        Alle Terme der Suchanfrage müssen vorkommen (UND-Verknüpfung).
+
+        Args:
+            query: Suchbegriffe als Freitext.
+            task_id: Optional nur Entscheidungen dieses Tasks berücksichtigen.
+            limit: Optional die maximale Anzahl Treffer.
+
+        Returns:
+            Die Treffer in Schreibreihenfolge.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            postings = sorted((self._by_term.get(term, set()) for term in terms), key=len)
+            matches = set.intersection(*postings) if postings[0] else set()
+            if task_id is not None:
+                matches &= self._by_task.get(task_id, {}).keys()
+            # Schreibreihenfolge entspricht der Sortierung nach Position.
+            locations = sorted(self._locations[decision_id] for decision_id in matches)
+            if limit is not None:
+                locations = locations[:limit]
+            return [self._read(location) for location in locations]
+
+    # === Kompaktierung ===
+
+    def compact(self) -> int:
+        """
+        Fasst alle abgeschlossenen Segmente zu einem Segment zusammen und entfernt
+        dabei überholte Einträge.
+
+        Das neue Segment übernimmt die höchste ID der zusammengefassten Segmente, damit
+        die Reihenfolge beim Wiederherstellen erhalten bleibt. Es wird erst vollständig
+        geschrieben und dann atomar per `os.replace` aktiviert.
+
+        Returns:
+            Die Anzahl der entfernten Einträge.
+
+        Raises:
+            IOError: Wenn das kompaktierte Segment nicht geschrieben werden kann
+                     oder der Store nur zum Lesen geöffnet ist.
+        """
+        if self.read_only:
+            raise IOError("decision log store is read-only")
+        with self._compaction_lock:
+            with self._lock:
+                sealed = [segment_id for segment_id in self._segments if segment_id != self._active_id]
+                live = sorted(
+                    (location, decision_id)
+                    for decision_id, location in self._locations.items()
+                    if location[0] in sealed
+                )
+                removed = sum(self._record_counts.get(segment_id, 0) for segment_id in sealed) - len(live)
+                if len(sealed) < 2 and removed == 0:
+                    return 0
+                records = [(decision_id, location, self._raw(location)) for location, decision_id in live]
+
+            # Schreiben außerhalb des Locks, damit Agenten weiter loggen können.
+            target_id = sealed[-1]
+            tmp_path = self._path(target_id) + ".compact"
+            relocated = []
+            try:
+                with open(tmp_path, "wb") as f:
+                    offset = 0
+                    for decision_id, location, payload in records:
+                        f.write(_HEADER.pack(len(payload), zlib.crc32(payload)))
+                        f.write(payload)
+                        relocated.append((decision_id, location, (target_id, offset + _HEADER.size, len(payload))))
+                        offset += _HEADER.size + len(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                logging.error(f"Fehler beim Schreiben des kompaktierten Segments {tmp_path}: {e}", exc_info=True)
+                raise IOError("decision log compaction error") from e
+
+            with self._lock:
+                for segment_id in sealed:
+                    data = self._maps.pop(segment_id, None)
+                    if data is not None:
+                        data.close()
+                os.replace(tmp_path, self._path(target_id))
+                for decision_id, old_location, new_location in relocated:
+                    # Nur übernehmen, wenn der Eintrag nicht zwischenzeitlich überschrieben wurde.
+                    if self._locations.get(decision_id) == old_location:
+                        self._locations[decision_id] = new_location
+                for segment_id in sealed[:-1]:
+                    os.remove(self._path(segment_id))
+                    self._record_counts.pop(segment_id, None)
+                self._record_counts[target_id] = len(relocated)
+                self._segments = [target_id] + [s for s in self._segments if s not in sealed]
+
+            logging.info(
+                f"Kompaktierung abgeschlossen: {len(sealed)} Segmente -> {_segment_name(target_id)}, "
+                f"{removed} überholte Einträge entfernt."
+            )
+            return removed
+
+    def _compaction_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            with self._lock:
+                sealed_count = len(self._segments) - 1
+            if sealed_count < self.compaction_min_segments:
+                continue
+            try:
+                self.compact()
+            except Exception as e:
+                logging.error(f"Hintergrund-Kompaktierung fehlgeschlagen: {e}", exc_info=True)
+
+    # === Lebenszyklus ===
+
+    def close(self) -> None:
+        """Beendet die Hintergrund-Kompaktierung und schließt alle Dateien."""
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            if self._active_file is not None:
+                self._active_file.close()
+                self._active_file = None
+            for data in self._maps.values():
+                data.close()
+            self._maps.clear()
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+from google.cloud import firestore
+
+from kiorga.datamodel import final_report_pb2, task_pb2
+from kiorga.utils.firestore_converters import message_from_firestore, message_to_firestore
+from kiorga.utils.process_model import PerProcess
+
+# Erhöhen, wenn sich die Berechnung des Schlüssels oder das Format der Ergebnisse ändert.
+CACHE_KEY_VERSION = 1
+
+# Opt-out pro Task für nicht-deterministische Arbeit:
+# `input_data_references["no_cache"] = "true"`.
+NO_CACHE_REFERENCE_KEY = "no_cache"
+
+_TRUE_VALUES = {"1", "true", "yes"}
+
+
+def is_cacheable(task: task_pb2.Task) -> bool:
+    """Prüft, ob das Ergebnis eines Tasks zwischengespeichert und wiederverwendet werden darf."""
+    return task.input_data_references.get(NO_CACHE_REFERENCE_KEY, "").strip().lower() not in _TRUE_VALUES
+
+
+def task_fingerprint(task: task_pb2.Task, namespace: str = "") -> str:
+    """
+    Berechnet den inhaltsadressierten Schlüssel eines Tasks.
+
+    Eingang finden nur die Felder, die die Arbeit bestimmen: `title`, `description`,
+    `input_data_references` und `success_criteria_metrics`. IDs, Status, Zeitstempel und
+    Zuständigkeiten bleiben unberücksichtigt, sodass derselbe Auftrag unter einer neuen
+    `task_id` denselben Schlüssel erhält. Die Kanonisierung (sortierte Map-Schlüssel,
+    kompaktes JSON) macht den Schlüssel unabhängig von der Reihenfolge der Eingaben.
+
+    Args:
+        task: Der Task.
+        namespace: Trennt die Schlüssel verschiedener Agenten (z.B. die Agent-ID).
+
+    Returns:
+        Der SHA-256-Hash als Hex-String.
+    """
+    canonical = json.dumps(
+        [
+            CACHE_KEY_VERSION,
+            namespace,
+            task.title,
+            task.description,
+            sorted(task.input_data_references.items()),
+            task.success_criteria_metrics,
+        ],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Zweistufiger Ergebnis-Cache für Tasks, adressiert über `task_fingerprint`.
+
+    Gespeichert wird ein FinalReport als Vorlage (`final_status`, `summary`,
+    `output_data_references`); IDs und Zeitstempel setzt der Agent bei einem Treffer neu.
+
+    - Lokale Stufe: LRU im Speicher des Prozesses mit höchstens `max_entries` Einträgen.
+    - Gemeinsame Stufe: Firestore-Collection `collection` (Dokument-ID = Schlüssel), die
+      sich alle Instanzen teilen. Ein Treffer dort wird in die lokale Stufe übernommen.
+
+    Beide Stufen verfallen nach `ttl` Sekunden. In Firestore steht der Ablaufzeitpunkt in
+    `expiresAt`; abgelaufene Dokumente werden beim Lesen ignoriert und sollten über eine
+    TTL-Richtlinie auf `expiresAt` gelöscht werden, die die Größe der Collection begrenzt.
+
+    Fehler der gemeinsamen Stufe werden protokolliert und wie ein Cache-Miss behandelt;
+    der Cache darf die Verarbeitung eines Tasks nie verhindern.
+    """
+
+    def __init__(
+        self,
+        db_client=None,
+        collection: str = "task_result_cache",
+        ttl: float = 24 * 3600,
+        max_entries: int = 1024,
+    ):
+        """
+        Args:
+            db_client: Firestore-Client für die gemeinsame Stufe; ohne Client nur lokal.
+            collection: Name der Firestore-Collection der gemeinsamen Stufe.
+            ttl: Lebensdauer eines Eintrags in Sekunden.
+            max_entries: Maximale Anzahl Einträge der lokalen Stufe.
+        """
+        if ttl <= 0:
+            raise ValueError("ttl muss größer als 0 sein")
+        self.db = db_client
+        self.collection = collection
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, final_report_pb2.FinalReport]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[final_report_pb2.FinalReport]:
+        """
+        Liefert die Ergebnisvorlage zu einem Schlüssel oder None.
+
+        Der Aufrufer darf das zurückgegebene Objekt nicht verändern.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+
+        if self.db is None:
+            return None
+        try:
+            snapshot = self.db.collection(self.collection).document(key).get()
+        except Exception as e:
+            logging.warning(f"Ergebnis-Cache: Lesen von {key} aus Firestore fehlgeschlagen: {e}")
+            return None
+        data = snapshot.to_dict() if snapshot.exists else None
+        if not data:
+            return None
+
+        try:
+            expires_at = data["expiresAt"].timestamp()
+            if expires_at <= now:
+                return None
+            report = message_from_firestore(data.get("report") or {}, final_report_pb2.FinalReport)
+        except Exception as e:
+            logging.warning(f"Ergebnis-Cache: Eintrag {key} ist ungültig und wird ignoriert: {e}")
+            return None
+        self._put_local(key, report, expires_at)
+        return report
+
+    def put(self, key: str, report: final_report_pb2.FinalReport, source_task_id: str = "") -> None:
+        """
+        Speichert die Ergebnisvorlage eines Berichts in beiden Stufen.
+
+        Args:
+            key: Der Schlüssel aus `task_fingerprint`.
+            report: Der veröffentlichte Abschlussbericht.
+            source_task_id: Der Task, dessen Bearbeitung das Ergebnis erzeugt hat.
+        """
+        template = final_report_pb2.FinalReport(
+            final_status=report.final_status,
+            summary=report.summary,
+            output_data_references=report.output_data_references,
+        )
+        expires_at = time.time() + self.ttl
+        self._put_local(key, template, expires_at)
+
+        if self.db is None:
+            return
+        try:
+            self.db.collection(self.collection).document(key).set({
+                "report": message_to_firestore(template),
+                "sourceTaskId": source_task_id,
+                "createdAt": firestore.SERVER_TIMESTAMP,
+                "expiresAt": datetime.fromtimestamp(expires_at, timezone.utc),
+            })
+        except Exception as e:
+            logging.warning(f"Ergebnis-Cache: Schreiben von {key} nach Firestore fehlgeschlagen: {e}")
+
+    def _put_local(self, key: str, report: final_report_pb2.FinalReport, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, report)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def result_cache_from_env(db_client) -> Optional[PerProcess[ResultCache]]:
+    """
+    Erstellt den prozesslokalen Ergebnis-Cache der Services aus der Umgebung.
+
+    Umgebungsvariablen:
+        RESULT_CACHE_TTL_SECONDS: Lebensdauer der Einträge (Standard: 86400, 0 = aus).
+        RESULT_CACHE_MAX_ENTRIES: Größe der lokalen Stufe (Standard: 1024).
+
+    Returns:
+        Den Cache (pro Worker-Prozess eine lokale Stufe) oder None, wenn er deaktiviert ist.
+    """
+    ttl = float(os.environ.get("RESULT_CACHE_TTL_SECONDS", "86400"))
+    max_entries = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "1024"))
+    if ttl <= 0:
+        return None
+    return PerProcess(lambda: ResultCache(db_client, ttl=ttl, max_entries=max_entries))
@@ -0,0 +1,331 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone
+from typing import Callable, List, Optional, Type
+
+from google.api_core import exceptions
+from google.cloud import pubsub_v1
+from google.protobuf.message import Message
+
+from kiorga.utils.pubsub_helpers import decode_pubsub_message, publish_proto_message_as_json
+from kiorga.utils.validation import parse_and_validate_message
+
+# Ergebniskategorien einer Nachricht beim Replay.
+REPUBLISHED = "republished"
+ALREADY_REPLAYED = "already_replayed"
+UNDECODABLE = "undecodable"
+INVALID = "invalid"
+PUBLISH_FAILED = "publish_failed"
+
+# Maximale Ack-Deadline von Pub/Sub sowie Reserve für Klassifizierung und Acknowledge.
+MAX_ACK_DEADLINE_SECONDS = 600
+LEASE_MARGIN_SECONDS = 60
+# Ein synchroner Pull kann leer zurückkommen, obwohl noch Nachrichten vorhanden sind.
+MAX_EMPTY_PULLS = 3
+
+
+class TokenBucket:
+    """
+    Thread-sicherer Token-Bucket zur Begrenzung der Veröffentlichungsrate.
+
+    Es werden `rate` Tokens pro Sekunde nachgefüllt, höchstens `capacity` Tokens
+    stehen für Bursts zur Verfügung.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate muss größer als 0 sein")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blockiert, bis ein Token verfügbar ist, und verbraucht es."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ReplayCheckpoint:
+    """
+    Persistenter Fortschritt eines Replays als JSON-Datei.
+
+    Gespeichert werden die Message-IDs, die bereits erneut veröffentlicht wurden. Bricht
+    ein Replay zwischen Veröffentlichen und Acknowledge ab, stellt Pub/Sub die Nachricht
+    erneut zu; beim Fortsetzen wird sie dann nur noch bestätigt und nicht doppelt
+    veröffentlicht.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.replayed_ids: set[str] = set()
+        self.stats: dict[str, int] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.replayed_ids = set(state.get("replayed_ids", []))
+            self.stats = state.get("stats", {})
+            logging.info(f"Checkpoint {path} geladen: {len(self.replayed_ids)} Nachrichten bereits veröffentlicht.")
+
+    def mark_replayed(self, message_id: str) -> None:
+        with self._lock:
+            self.replayed_ids.add(message_id)
+
+    def is_replayed(self, message_id: str) -> bool:
+        with self._lock:
+            return message_id in self.replayed_ids
+
+    def count(self, category: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[category] = self.stats.get(category, 0) + amount
+
+    def save(self) -> None:
+        """Schreibt den Checkpoint atomar (temporäre Datei + `os.replace`)."""
+        if not self.path:
+            return
+        with self._lock:
+            state = {"replayed_ids": sorted(self.replayed_ids), "stats": dict(self.stats)}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+
+def classify_message(
+    data: bytes,
+    publish_time: Optional[str],
+    message_class: Type[Message],
+    validator_func: Optional[Callable[[Message], List[str]]] = None,
+) -> tuple[str, Optional[Message], Optional[str]]:
+    """
+    Ordnet eine DLQ-Nachricht anhand derselben Schritte ein, die der Service ausführt.
+
+    Die Nachricht wird wie ein Push-Envelope mit `decode_pubsub_message` dekodiert und mit
+    `parse_and_validate_message` geparst. Besteht sie beide Schritte, lag der ursprüngliche
+    Fehler nicht an der Nachricht selbst (z.B. ein Firestore-Ausfall) und sie kann erneut
+    veröffentlicht werden.
+
+    Returns:
+        Ein Tupel aus Kategorie (`REPUBLISHED` für reparierbare Nachrichten, `UNDECODABLE`
+        oder `INVALID`), der geparsten Nachricht und einer Fehlerbeschreibung.
+    """
+    envelope = {
+        "message": {
+            "data": base64.b64encode(data).decode("ascii"),
+            "publish_time": publish_time,
+        }
+    }
+    try:
+        json_string, _ = decode_pubsub_message(envelope)
+    except ValueError as e:
+        return UNDECODABLE, None, str(e)
+
+    try:
+        message = parse_and_validate_message(json_string, message_class, validator_func)
+    except ValueError as e:
+        return INVALID, None, str(e)
+    return REPUBLISHED, message, None
+
+
+class DlqReplayer:
+    """
+    Leert ein Dead-Letter-Abonnement und veröffentlicht reparierbare Nachrichten erneut.
+
+    Nachrichten werden in Blöcken per synchronem Pull geholt, parallel klassifiziert und
+    unter einem Token-Bucket-Ratenlimit an das ursprüngliche Topic veröffentlicht.
+    Nicht reparierbare Nachrichten werden mit Rohdaten und Fehler in eine JSONL-Datei
+    geparkt und bestätigt, damit die DLQ vollständig geleert wird.
+    """
+
+    def __init__(
+        self,
+        subscriber: pubsub_v1.SubscriberClient,
+        publisher: pubsub_v1.PublisherClient,
+        project_id: str,
+        subscription_id: str,
+        target_topic: str,
+        message_class: Type[Message],
+        validator_func: Optional[Callable[[Message], List[str]]] = None,
+        rate: float = 100.0,
+        workers: int = 16,
+        batch_size: int = 500,
+        checkpoint_path: Optional[str] = None,
+        parked_path: Optional[str] = None,
+        dry_run: bool = False,
+    ):
+        self.subscriber = subscriber
+        self.publisher = publisher
+        self.project_id = project_id
+        self.subscription_path = subscriber.subscription_path(project_id, subscription_id)
+        self.target_topic = target_topic
+        self.message_class = message_class
+        self.validator_func = validator_func
+        self.bucket = TokenBucket(rate)
+        self.workers = workers
+        # Pub/Sub-Limit pro Pull; zusätzlich so begrenzt, dass ein Block unter dem
+        # Ratenlimit innerhalb der maximalen Ack-Deadline veröffentlicht werden kann.
+        max_per_lease = int(rate * (MAX_ACK_DEADLINE_SECONDS - LEASE_MARGIN_SECONDS))
+        self.batch_size = max(1, min(batch_size, 1000, max_per_lease))
+        self.checkpoint = ReplayCheckpoint(checkpoint_path)
+        self.parked_path = parked_path
+        self.dry_run = dry_run
+        self._parked_lock = threading.Lock()
+
+    def run(self, max_messages: Optional[int] = None) -> dict[str, int]:
+        """
+        Führt das Replay aus, bis die DLQ leer ist oder `max_messages` erreicht sind.
+
+        Die DLQ gilt als leer, wenn `MAX_EMPTY_PULLS` Pulls in Folge nichts liefern. Im
+        Dry-Run werden alle Nachrichten sofort wieder freigegeben (nack) und jede nur
+        einmal klassifiziert.
+
+        Returns:
+            Die kumulierten Zähler pro Kategorie (inklusive früherer, fortgesetzter Läufe).
+        """
+        processed = 0
+        empty_pulls = 0
+        # Nachrichten, die in diesem Lauf zurückgegeben wurden (Veröffentlichung fehlgeschlagen
+        # oder Dry-Run) und daher erneut zugestellt werden können.
+        returned_ids: set[str] = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while max_messages is None or processed < max_messages:
+                limit = self.batch_size if max_messages is None else min(self.batch_size, max_messages - processed)
+                received = self._pull(limit)
+                if not received:
+                    empty_pulls += 1
+                    if empty_pulls >= MAX_EMPTY_PULLS:
+                        break
+                    continue
+                empty_pulls = 0
+                # Nur bereits zurückgegebene Nachrichten erhalten: nichts Neues mehr zu tun.
+                if all(item.message.message_id in returned_ids for item in received):
+                    self._nack([item.ack_id for item in received])
+                    break
+
+                if self.dry_run:
+                    # Im Dry-Run jede Nachricht nur einmal zählen und nichts länger festhalten.
+                    self._nack([item.ack_id for item in received if item.message.message_id in returned_ids])
+                    received = [item for item in received if item.message.message_id not in returned_ids]
+                    results = list(executor.map(self._process, received))
+                    self._nack([item.ack_id for item in received])
+                    returned_ids.update(item.message.message_id for item in received)
+                else:
+                    self._extend_leases(received)
+                    results = list(executor.map(self._process, received))
+                    ack_ids = [item.ack_id for item, category in zip(received, results) if category != PUBLISH_FAILED]
+                    nack_ids = [item.ack_id for item, category in zip(received, results) if category == PUBLISH_FAILED]
+                    returned_ids.update(
+                        item.message.message_id for item, category in zip(received, results) if category == PUBLISH_FAILED
+                    )
+                    # Erst den Fortschritt sichern, dann bestätigen: Bricht der Lauf dazwischen
+                    # ab, werden erneut zugestellte Nachrichten nicht doppelt veröffentlicht.
+                    self.checkpoint.save()
+                    self._acknowledge(ack_ids)
+                    self._nack(nack_ids)
+
+                processed += len(received)
+                logging.info(f"DLQ-Replay: {processed} Nachrichten verarbeitet, Stand: {self.checkpoint.stats}")
+
+        return dict(self.checkpoint.stats)
+
+    def _pull(self, limit: int) -> list:
+        try:
+            response = self.subscriber.pull(
+                request={"subscription": self.subscription_path, "max_messages": limit},
+                timeout=30,
+            )
+            return list(response.received_messages)
+        except exceptions.DeadlineExceeded:
+            return []
+        except exceptions.GoogleAPICallError as e:
+            logging.error(f"Pull von {self.subscription_path} fehlgeschlagen: {e}", exc_info=True)
+            raise IOError(f"Pub/Sub pull error on {self.subscription_path}") from e
+
+    def _extend_leases(self, received: list) -> None:
+        """Verlängert die Ack-Deadline eines Blocks auf die erwartete Veröffentlichungsdauer."""
+        seconds = min(MAX_ACK_DEADLINE_SECONDS, int(len(received) / self.bucket.rate) + LEASE_MARGIN_SECONDS)
+        self.subscriber.modify_ack_deadline(
+            request={
+                "subscription": self.subscription_path,
+                "ack_ids": [item.ack_id for item in received],
+                "ack_deadline_seconds": seconds,
+            }
+        )
+
+    def _process(self, received) -> str:
+        pubsub_message = received.message
+        message_id = pubsub_message.message_id
+
+        if self.checkpoint.is_replayed(message_id):
+            category = ALREADY_REPLAYED
+        else:
+            publish_time = None
+            if pubsub_message.publish_time:
+                publish_time = pubsub_message.publish_time.astimezone(timezone.utc).isoformat()
+            category, message, error = classify_message(
+                pubsub_message.data, publish_time, self.message_class, self.validator_func
+            )
+            if category == REPUBLISHED:
+                category = self._republish(message_id, message)
+            else:
+                self._park(pubsub_message, category, error)
+
+        self.checkpoint.count(category)
+        return category
+
+    def _republish(self, message_id: str, message: Message) -> str:
+        if self.dry_run:
+            return REPUBLISHED
+        self.bucket.acquire()
+        try:
+            publish_proto_message_as_json(
+                publisher=self.publisher,
+                project_id=self.project_id,
+                topic_id=self.target_topic,
+                proto_message=message,
+            )
+        except IOError as e:
+            logging.warning(f"Erneutes Veröffentlichen von {message_id} fehlgeschlagen: {e}")
+            return PUBLISH_FAILED
+        self.checkpoint.mark_replayed(message_id)
+        return REPUBLISHED
+
+    def _park(self, pubsub_message, category: str, error: Optional[str]) -> None:
+        logging.warning(f"Nachricht {pubsub_message.message_id} ist nicht reparierbar ({category}): {error}")
+        if not self.parked_path or self.dry_run:
+            return
+        record = {
+            "message_id": pubsub_message.message_id,
+            "category": category,
+            "error": error,
+            "data": base64.b64encode(pubsub_message.data).decode("ascii"),
+            "attributes": dict(pubsub_message.attributes),
+        }
+        with self._parked_lock, open(self.parked_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _acknowledge(self, ack_ids: list[str]) -> None:
+        if ack_ids:
+            self.subscriber.acknowledge(request={"subscription": self.subscription_path, "ack_ids": ack_ids})
+
+    def _nack(self, ack_ids: list[str]) -> None:
+        # Ein Ack-Deadline von 0 gibt die Nachrichten sofort wieder frei.
+        if ack_ids:
+            self.subscriber.modify_ack_deadline(
+                request={"subscription": self.subscription_path, "ack_ids": ack_ids, "ack_deadline_seconds": 0}
+            )
@@ -1,7 +1,18 @@
 import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
 from fastapi import FastAPI, Request, HTTPException
 
-def create_app(service_handler: object, process_method_name: str) -> FastAPI:
+from kiorga.utils.process_model import metrics
+
+def create_app(
+    service_handler: object,
+    process_method_name: str,
+    batch_method_name: Optional[str] = None,
+    on_shutdown: Optional[Callable[[], None]] = None,
+) -> FastAPI:
     """
     Erstellt und konfiguriert eine FastAPI-Anwendung mit einem generischen Pub/Sub-Endpunkt.
 
@@ -12,11 +23,22 @@ def create_app(service_handler: object, process_method_name: str) -> FastAPI:
         service_handler: Eine Instanz der Service-Klasse (z.B. TaskHandler, TaskHandler).
         process_method_name: Der Name der Methode auf dem Service-Handler, die die
                              eigentliche Verarbeitungslogik enthält (z.B. "handle_task").
+        batch_method_name: Optional der Name der Methode für Batch-Anfragen. Ist er gesetzt,
+                           wird zusätzlich der Endpunkt `POST /batch` registriert, der das
+                           Ergebnis der Methode (Ergebnisse pro Element) als JSON zurückgibt.
+        on_shutdown: Optional eine Funktion, die beim Beenden des Worker-Prozesses aufgerufen
+                     wird (z.B. um noch nicht zugestellte Nachrichten abzugeben).
 
     Returns:
         Eine konfigurierte FastAPI-Anwendungsinstanz.
     """
-    app = FastAPI()
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        yield
+        if on_shutdown is not None:
+            on_shutdown()
+
+    app = FastAPI(lifespan=lifespan)
 
     @app.post("/")
     async def index(request: Request):
@@ -29,18 +51,76 @@ def create_app(service_handler: object, process_method_name: str) -> FastAPI:
             logging.error(msg)
             raise HTTPException(status_code=400, detail=f"Bad Request: {msg}")
 
+        start_time = time.perf_counter()
+        metrics.increment("requests_total")
         try:
             handler_method = getattr(service_handler, process_method_name)
             handler_method(envelope)
             return "", 204
         except ValueError as e:
+            metrics.increment("requests_bad_request_total")
             logging.warning(f"Bad Request bei der Verarbeitung: {e}")
             raise HTTPException(status_code=400, detail=f"Bad Request: {e}")
         except IOError as e:
+            metrics.increment("requests_failed_total")
             logging.error(f"IO-Fehler bei der Verarbeitung: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
         except Exception as e:
+            metrics.increment("requests_failed_total")
             logging.error(f"Unerwarteter Fehler bei der Verarbeitung: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail="Internal Server Error: unexpected error")
+        finally:
+            metrics.increment("processing_seconds_total", time.perf_counter() - start_time)
+
+    if batch_method_name:
+        @app.post("/batch")
+        async def batch(request: Request):
+            """
+            Empfängt eine Batch-Anfrage (direkt als JSON oder als Pub/Sub-Nachricht) und
+            gibt die Ergebnisse pro Element zurück.
+
+            Kommt der Batch als Pub/Sub-Nachricht und ist mindestens ein Element `failed`,
+            antwortet der Endpunkt mit 500, damit Pub/Sub den Batch erneut zustellt; bereits
+            verarbeitete Elemente überspringt der Handler dabei (Idempotenz).
+            """
+            payload = await request.json()
+            if not payload:
+                msg = "no batch payload received"
+                logging.error(msg)
+                raise HTTPException(status_code=400, detail=f"Bad Request: {msg}")
+
+            start_time = time.perf_counter()
+            metrics.increment("batch_requests_total")
+            try:
+                handler_method = getattr(service_handler, batch_method_name)
+                results = handler_method(payload)
+            except ValueError as e:
+                metrics.increment("requests_bad_request_total")
+                logging.warning(f"Bad Request bei der Batch-Verarbeitung: {e}")
+                raise HTTPException(status_code=400, detail=f"Bad Request: {e}")
+            except IOError as e:
+                metrics.increment("requests_failed_total")
+                logging.error(f"IO-Fehler bei der Batch-Verarbeitung: {e}", exc_info=True)
+                raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
+            except Exception as e:
+                metrics.increment("requests_failed_total")
+                logging.error(f"Unerwarteter Fehler bei der Batch-Verarbeitung: {e}", exc_info=True)
+                raise HTTPException(status_code=500, detail="Internal Server Error: unexpected error")
+            finally:
+                metrics.increment("processing_seconds_total", time.perf_counter() - start_time)
+
+            failed = sum(1 for result in results if result.get("status") == "failed")
+            if failed and isinstance(payload, dict) and "message" in payload:
+                metrics.increment("requests_failed_total")
+                logging.error(f"{failed} Elemente des Pub/Sub-Batches fehlgeschlagen; fordere erneute Zustellung an.")
+                raise HTTPException(status_code=500, detail={"error": f"{failed} batch items failed", "results": results})
+            return {"results": results}
+
+    @app.get("/metrics")
+    async def get_metrics():
+        """
+        Liefert die über alle Worker-Prozesse aggregierten Zähler.
+        """
+        return metrics.aggregate()
 
     return app
\ No newline at end of file
@@ -0,0 +1,446 @@
+import base64
+import keyword
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Iterable, Optional, Type, TypeVar, Union
+
+from google.protobuf import duration_pb2, field_mask_pb2, timestamp_pb2
+from google.protobuf.descriptor import Descriptor, FieldDescriptor
+from google.protobuf.message import Message
+
+from kiorga.datamodel import (
+    decision_log_pb2,
+    feedback_log_pb2,
+    final_report_pb2,
+    progress_report_pb2,
+    task_pb2,
+    test_result_report_pb2,
+)
+
+# Generic TypeVar für Protobuf-Nachrichten, um Typsicherheit zu gewährleisten
+T = TypeVar('T', bound=Message)
+
+FieldMaskLike = Union[field_mask_pb2.FieldMask, Iterable[str]]
+
+# Feldarten, nach denen die vorberechneten Konverter verzweigen.
+_SCALAR = 0
+_MESSAGE = 1
+_REPEATED = 2
+_MAP = 3
+
+_INT64_TYPES = frozenset({
+    FieldDescriptor.TYPE_INT64,
+    FieldDescriptor.TYPE_UINT64,
+    FieldDescriptor.TYPE_SINT64,
+    FieldDescriptor.TYPE_FIXED64,
+    FieldDescriptor.TYPE_SFIXED64,
+})
+
+_TIMESTAMP = timestamp_pb2.Timestamp.DESCRIPTOR.full_name
+_DURATION = duration_pb2.Duration.DESCRIPTOR.full_name
+
+
+def _is_repeated(field: FieldDescriptor) -> bool:
+    """Kompatibel mit protobuf < 6.31 (`label`) und neueren Versionen (`is_repeated`)."""
+    is_repeated = getattr(field, "is_repeated", None)
+    if is_repeated is not None:
+        return is_repeated
+    return field.label == FieldDescriptor.LABEL_REPEATED
+
+
+def _is_map(field: FieldDescriptor) -> bool:
+    return (
+        field.type == FieldDescriptor.TYPE_MESSAGE
+        and field.message_type.GetOptions().map_entry
+    )
+
+
+# === Well-Known-Types ===
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _timestamp_to_firestore(ts: timestamp_pb2.Timestamp) -> datetime:
+    # Exakt auf Mikrosekunden (Firestore-Auflösung) und deutlich schneller als `ToDatetime`.
+    return _EPOCH + timedelta(seconds=ts.seconds, microseconds=ts.nanos // 1000)
+
+
+def _timestamp_from_firestore(ts: timestamp_pb2.Timestamp, value: Any) -> None:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        ts.FromDatetime(value)
+    elif isinstance(value, str):
+        # Altbestand, der noch über json_format.MessageToDict geschrieben wurde.
+        ts.FromJsonString(value)
+    else:
+        raise ValueError(f"unsupported timestamp value: {value!r}")
+
+
+def _duration_to_firestore(duration: duration_pb2.Duration) -> float:
+    # Firestore kennt keinen Duration-Typ; Sekunden als Float sind direkt aggregierbar.
+    return duration.seconds + duration.nanos / 1e9
+
+
+def _duration_from_firestore(duration: duration_pb2.Duration, value: Any) -> None:
+    if isinstance(value, timedelta):
+        duration.FromTimedelta(value)
+    elif isinstance(value, (int, float)):
+        duration.FromNanoseconds(int(round(value * 1e9)))
+    elif isinstance(value, str):
+        duration.FromJsonString(value)
+    else:
+        raise ValueError(f"unsupported duration value: {value!r}")
+
+
+# === Skalare Lese-Konvertierungen (Firestore -> Protobuf) ===
+
+def _scalar_reader(field: FieldDescriptor) -> Optional[Callable[[Any], Any]]:
+    """
+    Liefert eine Konvertierungsfunktion für skalare Werte aus Firestore oder `None`,
+    wenn der Wert unverändert übernommen werden kann.
+    """
+    if field.type == FieldDescriptor.TYPE_ENUM:
+        values_by_name = field.enum_type.values_by_name
+
+        def read_enum(value: Any) -> int:
+            # Enums werden als Zahl gespeichert; Namen stammen aus Altbestand.
+            if isinstance(value, str):
+                return values_by_name[value].number
+            return value
+        return read_enum
+    if field.type in _INT64_TYPES:
+        # MessageToDict schreibt 64-Bit-Integer als String.
+        return int
+    if field.type == FieldDescriptor.TYPE_BYTES:
+        def read_bytes(value: Any) -> bytes:
+            if isinstance(value, str):
+                return base64.b64decode(value)
+            return value
+        return read_bytes
+    return None
+
+
+def _map_key_reader(field: FieldDescriptor) -> Callable[[str], Any]:
+    key_field = field.message_type.fields_by_name["key"]
+    if key_field.type == FieldDescriptor.TYPE_STRING:
+        return str
+    if key_field.type == FieldDescriptor.TYPE_BOOL:
+        return lambda key: key == "true"
+    return int
+
+
+def _map_key_writer(field: FieldDescriptor) -> Callable[[Any], str]:
+    key_field = field.message_type.fields_by_name["key"]
+    if key_field.type == FieldDescriptor.TYPE_BOOL:
+        return lambda key: "true" if key else "false"
+    return str
+
+
+class FirestoreConverter:
+    """
+    Vorberechneter, bidirektionaler Konverter zwischen einem Protobuf-Nachrichtentyp
+    und einem Firestore-Dokument.
+
+    Im Gegensatz zu `json_format.MessageToDict`/`ParseDict` wird der Descriptor nur
+    einmal beim Erstellen ausgewertet. Timestamps werden als native Firestore-Zeitstempel
+    (`datetime`), Enums als Zahlen und 64-Bit-Integer als `int` gespeichert. Die
+    Feldnamen entsprechen weiterhin den JSON-Namen (camelCase), damit bestehende
+    Dokumente und Abfragen (z.B. `taskId`) kompatibel bleiben.
+    """
+
+    def __init__(self, descriptor: Descriptor):
+        self.descriptor = descriptor
+        self._fields = {}
+        self._readers = {}
+
+        for field in descriptor.fields:
+            kind, encode, read = self._build_field(field)
+            self._fields[field.name] = (field, kind, encode)
+            self._readers[field.json_name] = read
+            # Auch snake_case-Schlüssel akzeptieren (z.B. manuell geschriebenes `updated_at`).
+            self._readers.setdefault(field.name, read)
+
+        self._encode = self._generate_encoder()
+
+    def _generate_encoder(self) -> Callable[[Message], dict]:
+        """
+        Generiert den Quelltext einer Funktion, die alle Felder ohne Schleife und
+        ohne Descriptor-Zugriffe kodiert, und kompiliert ihn einmalig.
+        """
+        namespace = {}
+        lines = ["def encode(message):", "    result = {}"]
+        for index, (field, kind, encode) in enumerate(self._fields.values()):
+            key = repr(field.json_name)
+            # Feldnamen, die Python-Schlüsselwörter sind, nur über getattr erreichbar.
+            access = f"getattr(message, {field.name!r})" if keyword.iskeyword(field.name) else f"message.{field.name}"
+            if kind == _SCALAR:
+                lines.append(f"    value = {access}")
+                lines.append(f"    if value: result[{key}] = value")
+            elif kind == _MESSAGE:
+                namespace[f"encode_{index}"] = encode
+                lines.append(f"    if message.HasField({field.name!r}): result[{key}] = encode_{index}({access})")
+            else:
+                namespace[f"encode_{index}"] = encode
+                lines.append(f"    value = {access}")
+                lines.append(f"    if value: result[{key}] = encode_{index}(value)")
+        lines.append("    return result")
+        exec(compile("\n".join(lines), f"<firestore encoder {self.descriptor.full_name}>", "exec"), namespace)
+        return namespace["encode"]
+
+    def _build_field(self, field: FieldDescriptor):
+        """Erzeugt die Kodier- und Lesefunktion für ein einzelnes Feld."""
+        name = field.name
+
+        if _is_map(field):
+            value_field = field.message_type.fields_by_name["value"]
+            write_key = _map_key_writer(field)
+            read_key = _map_key_reader(field)
+            if value_field.type == FieldDescriptor.TYPE_MESSAGE:
+                encode_value = _message_encoder(value_field.message_type)
+                fill_value = _message_filler(value_field.message_type)
+
+                def encode(container):
+                    return {write_key(k): encode_value(v) for k, v in container.items()}
+
+                def read(message, value):
+                    container = getattr(message, name)
+                    for k, v in value.items():
+                        fill_value(container[read_key(k)], v)
+            else:
+                read_value = _scalar_reader(value_field)
+                key_type = field.message_type.fields_by_name["key"].type
+
+                if key_type == FieldDescriptor.TYPE_STRING:
+                    def encode(container):
+                        return dict(container)
+                else:
+                    def encode(container):
+                        return {write_key(k): v for k, v in container.items()}
+
+                def read(message, value):
+                    container = getattr(message, name)
+                    if read_value is None:
+                        for k, v in value.items():
+                            container[read_key(k)] = v
+                    else:
+                        for k, v in value.items():
+                            container[read_key(k)] = read_value(v)
+            return _MAP, encode, read
+
+        if _is_repeated(field):
+            if field.type == FieldDescriptor.TYPE_MESSAGE:
+                encode_item = _message_encoder(field.message_type)
+                fill_item = _message_filler(field.message_type)
+
+                def encode(container):
+                    return [encode_item(item) for item in container]
+
+                def read(message, value):
+                    container = getattr(message, name)
+                    for item in value:
+                        fill_item(container.add(), item)
+            else:
+                read_item = _scalar_reader(field)
+
+                def encode(container):
+                    return list(container)
+
+                def read(message, value):
+                    container = getattr(message, name)
+                    if read_item is None:
+                        container.extend(value)
+                    else:
+                        container.extend(read_item(item) for item in value)
+            return _REPEATED, encode, read
+
+        if field.type == FieldDescriptor.TYPE_MESSAGE:
+            encode = _message_encoder(field.message_type)
+            fill = _message_filler(field.message_type)
+
+            def read(message, value):
+                fill(getattr(message, name), value)
+            return _MESSAGE, encode, read
+
+        read_scalar = _scalar_reader(field)
+        if read_scalar is None:
+            def read(message, value):
+                setattr(message, name, value)
+        else:
+            def read(message, value):
+                setattr(message, name, read_scalar(value))
+        return _SCALAR, None, read
+
+    def to_firestore(self, message: Message, field_mask: Optional[FieldMaskLike] = None) -> dict:
+        """
+        Konvertiert eine Protobuf-Nachricht in ein Firestore-Dokument.
+
+        Ohne Feldmaske werden, wie bei `MessageToDict`, nur gesetzte Felder übernommen.
+        Mit Feldmaske entsteht ein flaches Dictionary mit Firestore-Feldpfaden
+        (z.B. `{"status": 2, "assignedToAgentId": "..."}`), das direkt an
+        `DocumentReference.update()` übergeben werden kann. Maskierte Felder werden
+        auch mit ihrem Standardwert geschrieben.
+
+        Args:
+            message: Die zu konvertierende Protobuf-Nachricht.
+            field_mask: Optional eine `FieldMask` oder eine Liste von Protobuf-Feldpfaden
+                        (snake_case, verschachtelt mit '.').
+
+        Returns:
+            Ein Dictionary mit Firestore-kompatiblen Werten.
+
+        Raises:
+            ValueError: Wenn ein Pfad der Feldmaske nicht existiert.
+        """
+        if field_mask is not None:
+            return self._masked_to_firestore(message, field_mask)
+
+        return self._encode(message)
+
+    def from_firestore(self, data: dict, message: Optional[Message] = None) -> Message:
+        """
+        Befüllt eine Protobuf-Nachricht aus einem Firestore-Dokument.
+
+        Unbekannte Schlüssel und `None`-Werte werden ignoriert. Neben nativen Werten
+        werden auch Dokumente gelesen, die noch mit `MessageToDict` geschrieben wurden
+        (Enum-Namen, RFC-3339-Zeitstempel, 64-Bit-Integer als String).
+
+        Args:
+            data: Das Firestore-Dokument als Dictionary (z.B. `snapshot.to_dict()`).
+            message: Optional eine bestehende Nachricht, in die die Werte gemischt werden.
+
+        Returns:
+            Die befüllte Protobuf-Nachricht.
+
+        Raises:
+            ValueError: Wenn ein Wert nicht in den Feldtyp konvertiert werden kann.
+        """
+        if message is None:
+            message = _message_class(self.descriptor)()
+        try:
+            self._fill(message, data)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"firestore conversion error for {self.descriptor.name}: {e}") from e
+        return message
+
+    def _fill(self, message: Message, data: dict) -> None:
+        readers = self._readers
+        for key, value in data.items():
+            read = readers.get(key)
+            if read is not None and value is not None:
+                read(message, value)
+
+    def _masked_to_firestore(self, message: Message, field_mask: FieldMaskLike) -> dict:
+        paths = field_mask.paths if isinstance(field_mask, field_mask_pb2.FieldMask) else field_mask
+        result = {}
+        for path in paths:
+            key, value = self._resolve_path(message, path.split("."), path)
+            result[key] = value
+        return result
+
+    def _resolve_path(self, message: Message, segments: list, path: str) -> tuple:
+        entry = self._fields.get(segments[0])
+        if entry is None:
+            raise ValueError(f"invalid field mask path '{path}' for {self.descriptor.name}")
+        field, kind, encode = entry
+
+        if len(segments) == 1:
+            if kind == _SCALAR:
+                return field.json_name, getattr(message, field.name)
+            if kind == _MESSAGE:
+                value = encode(getattr(message, field.name)) if message.HasField(field.name) else None
+                return field.json_name, value
+            return field.json_name, encode(getattr(message, field.name))
+
+        if kind != _MESSAGE or field.message_type.full_name in (_TIMESTAMP, _DURATION):
+            raise ValueError(f"invalid field mask path '{path}' for {self.descriptor.name}")
+        sub_converter = _converter_for(field.message_type)
+        sub_key, value = sub_converter._resolve_path(getattr(message, field.name), segments[1:], path)
+        return f"{field.json_name}.{sub_key}", value
+
+
+def _message_encoder(descriptor: Descriptor) -> Callable[[Message], Any]:
+    if descriptor.full_name == _TIMESTAMP:
+        return _timestamp_to_firestore
+    if descriptor.full_name == _DURATION:
+        return _duration_to_firestore
+    encoder = None
+
+    def encode(message: Message) -> dict:
+        # Verzögerte Auflösung erlaubt rekursive Nachrichtentypen.
+        nonlocal encoder
+        if encoder is None:
+            encoder = _converter_for(descriptor)._encode
+        return encoder(message)
+    return encode
+
+
+def _message_filler(descriptor: Descriptor) -> Callable[[Message, Any], None]:
+    if descriptor.full_name == _TIMESTAMP:
+        return _timestamp_from_firestore
+    if descriptor.full_name == _DURATION:
+        return _duration_from_firestore
+
+    def fill(message: Message, value: Any) -> None:
+        message.SetInParent()
+        _converter_for(descriptor)._fill(message, value)
+    return fill
+
+
+# === Registry ===
+
+_CONVERTERS: dict = {}
+_MESSAGE_CLASSES: dict = {}
+
+
+def _converter_for(descriptor: Descriptor) -> FirestoreConverter:
+    converter = _CONVERTERS.get(descriptor.full_name)
+    if converter is None:
+        converter = FirestoreConverter(descriptor)
+        _CONVERTERS[descriptor.full_name] = converter
+    return converter
+
+
+def _message_class(descriptor: Descriptor) -> Type[Message]:
+    message_class = _MESSAGE_CLASSES.get(descriptor.full_name)
+    if message_class is None:
+        from google.protobuf import message_factory
+        message_class = message_factory.GetMessageClass(descriptor)
+        _MESSAGE_CLASSES[descriptor.full_name] = message_class
+    return message_class
+
+
+def get_converter(message_class: Type[Message]) -> FirestoreConverter:
+    """Gibt den (einmalig erzeugten) Konverter für einen Protobuf-Nachrichtentyp zurück."""
+    _MESSAGE_CLASSES.setdefault(message_class.DESCRIPTOR.full_name, message_class)
+    return _converter_for(message_class.DESCRIPTOR)
+
+
+def message_to_firestore(message: Message, field_mask: Optional[FieldMaskLike] = None) -> dict:
+    """
+    Konvertiert eine Protobuf-Nachricht in ein Firestore-Dokument.
+
+    Schneller Ersatz für `json_format.MessageToDict`; siehe `FirestoreConverter.to_firestore`.
+    """
+    return get_converter(type(message)).to_firestore(message, field_mask)
+
+
+def message_from_firestore(data: dict, message_class: Type[T]) -> T:
+    """
+    Erstellt eine Protobuf-Nachricht aus einem Firestore-Dokument.
+
+    Schneller Ersatz für `json_format.ParseDict`; siehe `FirestoreConverter.from_firestore`.
+    """
+    return get_converter(message_class).from_firestore(data, message_class())
+
+
+# Konverter für alle Nachrichten aus kiorga.datamodel einmalig beim Import erzeugen.
+for _module in (
+    decision_log_pb2,
+    feedback_log_pb2,
+    final_report_pb2,
+    progress_report_pb2,
+    task_pb2,
+    test_result_report_pb2,
+):
+    for _name in _module.DESCRIPTOR.message_types_by_name:
+        get_converter(getattr(_module, _name))
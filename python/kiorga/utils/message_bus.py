@@ -0,0 +1,320 @@
+import collections
+import contextlib
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+from google.protobuf.message import Message
+
+from kiorga.utils.pubsub_helpers import publish_proto_message_as_json, publish_proto_messages_as_json
+
+
+class PubSubBus:
+    """
+    Veröffentlicht Protobuf-Nachrichten über Pub/Sub (JSON, siehe `publish_proto_message_as_json`).
+
+    Standard-Bus der Services, wenn sie als eigenständige Container laufen.
+    """
+
+    def __init__(self, publisher, project_id: str):
+        self.publisher = publisher
+        self.project_id = project_id
+
+    def publish(self, topic_id: str, message: Message) -> str:
+        """
+        Raises:
+            IOError: Wenn das Veröffentlichen in Pub/Sub fehlschlägt.
+        """
+        return publish_proto_message_as_json(
+            publisher=self.publisher,
+            project_id=self.project_id,
+            topic_id=topic_id,
+            proto_message=message,
+        )
+
+    def publish_many(self, topic_id: str, messages: list[Message]) -> list:
+        """
+        Veröffentlicht mehrere Nachrichten gebündelt.
+
+        Returns:
+            Pro Nachricht die Message-ID oder die aufgetretene Exception.
+        """
+        return publish_proto_messages_as_json(
+            publisher=self.publisher,
+            project_id=self.project_id,
+            topic_id=topic_id,
+            proto_messages=messages,
+        )
+
+
+class InMemoryBus:
+    """
+    Prozessinterner Bus, der Protobuf-Objekte ohne Serialisierung zwischen Handlern weitergibt.
+
+    Für Topics mit lokalem Abonnenten wird die Nachricht in eine Warteschlange gestellt und
+    von Dispatcher-Threads an den Handler übergeben. Für alle anderen Topics wird an den
+    `fallback`-Bus (in der Regel `PubSubBus`) delegiert, sodass entfernte Agenten weiterhin
+    über Pub/Sub erreicht werden.
+
+    Nachrichten, die ein Handler während seiner Ausführung veröffentlicht, werden erst nach
+    dessen erfolgreichem Abschluss zugestellt. Das entspricht der Reihenfolge bei Pub/Sub,
+    wo der nächste Agent erst nach der Zustelllatenz startet: Der Folge-Agent sieht z.B. die
+    Firestore-Aktualisierung, die der Handler nach dem Veröffentlichen noch vornimmt.
+
+    Handler erhalten dasselbe Objekt, das veröffentlicht wurde, und dürfen es nicht verändern.
+
+    Schlägt eine lokale Zustellung fehl, wird sie mit exponentiellem Backoff wiederholt.
+    Nach `max_attempts` Versuchen (bei ungültigen Nachrichten sofort) wird die Nachricht an
+    den Fallback-Bus übergeben, sodass die Retry-Policy und die DLQ des echten Topics
+    greifen. Das setzt voraus, dass das Topic ein Abonnement besitzt (z.B. den
+    eigenständigen Service). Nur ohne Fallback oder wenn auch dieser fehlschlägt, landet
+    die Nachricht in `dead_letters`.
+
+    Die Dispatcher laufen nach der Antwort auf den Push-Request weiter. Der Prozess braucht
+    daher CPU auch zwischen Requests (Cloud Run: `--no-cpu-throttling`), und beim Beenden
+    muss `shutdown()` aufgerufen werden: Es übergibt alle noch nicht zugestellten
+    Nachrichten an den Fallback-Bus.
+    """
+
+    def __init__(
+        self,
+        fallback: Optional[PubSubBus] = None,
+        workers: int = 4,
+        max_attempts: int = 5,
+        retry_backoff: float = 0.5,
+        max_retry_backoff: float = 30.0,
+    ):
+        """
+        Args:
+            fallback: Bus für Topics ohne lokalen Abonnenten und für Nachrichten, deren
+                      lokale Zustellung endgültig fehlschlägt. Ohne Fallback führt das
+                      Veröffentlichen an ein Topic ohne lokalen Abonnenten zu einem IOError.
+            workers: Anzahl der Dispatcher-Threads.
+            max_attempts: Lokale Zustellversuche pro Nachricht vor der Übergabe an den Fallback.
+            retry_backoff: Wartezeit in Sekunden vor dem zweiten Versuch; verdoppelt sich
+                           mit jedem weiteren Versuch.
+            max_retry_backoff: Obergrenze der Wartezeit zwischen zwei Versuchen.
+        """
+        self.fallback = fallback
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        # Nur die letzten endgültig nicht zustellbaren Nachrichten, für die Fehlersuche.
+        self.dead_letters: "collections.deque[tuple[str, Message, Exception]]" = collections.deque(maxlen=1000)
+        self.workers = workers
+        self._subscribers: dict[str, Callable[[Message], None]] = {}
+        self._outbox = threading.local()
+        self._start_lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._pid: Optional[int] = None
+        self._threads: list[threading.Thread] = []
+        self._timers: dict[threading.Timer, tuple] = {}
+        # Schützt `_closing` und `_timers`, damit nach dem Shutdown nichts mehr in der
+        # Warteschlange landet, das kein Dispatcher mehr abholt.
+        self._state_lock = threading.Lock()
+        self._closing = False
+
+    def _ensure_started(self) -> queue.Queue:
+        # Threads überleben kein fork(); jeder Worker-Prozess startet daher eigene Dispatcher.
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._start_lock:
+                if self._pid != pid:
+                    self._queue = queue.Queue()
+                    self._timers = {}
+                    self._threads = [
+                        threading.Thread(
+                            target=self._dispatch_loop, args=(self._queue,), name=f"in-memory-bus-{i}", daemon=True
+                        )
+                        for i in range(self.workers)
+                    ]
+                    for thread in self._threads:
+                        thread.start()
+                    self._pid = pid
+        return self._queue
+
+    def subscribe(self, topic_id: str, handler: Callable[[Message], None]) -> None:
+        """Registriert einen lokalen Handler für ein Topic."""
+        self._subscribers[topic_id] = handler
+
+    def is_local(self, topic_id: str) -> bool:
+        return topic_id in self._subscribers
+
+    def publish(self, topic_id: str, message: Message) -> str:
+        """
+        Stellt eine Nachricht lokal zu oder delegiert sie an den Fallback-Bus.
+
+        Returns:
+            Die Message-ID (lokal eine UUID, sonst die Pub/Sub-Message-ID).
+
+        Raises:
+            IOError: Wenn das Topic weder lokal noch über einen Fallback erreichbar ist.
+        """
+        if topic_id not in self._subscribers or self._closing:
+            if self.fallback is None:
+                raise IOError(f"no local subscriber and no fallback for topic {topic_id}")
+            return self.fallback.publish(topic_id, message)
+
+        message_id = str(uuid.uuid4())
+        pending = getattr(self._outbox, "pending", None)
+        if pending is not None:
+            pending.append((topic_id, message, 1))
+        else:
+            self._enqueue(self._ensure_started(), (topic_id, message, 1))
+        logging.info(f"Nachricht {message_id} lokal an Topic '{topic_id}' übergeben.")
+        return message_id
+
+    def publish_many(self, topic_id: str, messages: list[Message]) -> list:
+        """
+        Veröffentlicht mehrere Nachrichten; entfernte Topics gebündelt über den Fallback-Bus.
+
+        Returns:
+            Pro Nachricht die Message-ID oder die aufgetretene Exception.
+        """
+        if topic_id not in self._subscribers and self.fallback is not None:
+            return self.fallback.publish_many(topic_id, messages)
+        results = []
+        for message in messages:
+            try:
+                results.append(self.publish(topic_id, message))
+            except IOError as e:
+                results.append(e)
+        return results
+
+    @contextlib.contextmanager
+    def deferred(self):
+        """
+        Sammelt alle lokalen Veröffentlichungen innerhalb des Blocks und stellt sie erst
+        zu, wenn der Block ohne Ausnahme verlassen wird.
+        """
+        if getattr(self._outbox, "pending", None) is not None:
+            # Bereits innerhalb eines Handlers: die äußere Klammer stellt zu.
+            yield
+            return
+        self._outbox.pending = []
+        try:
+            yield
+            if self._outbox.pending:
+                work_queue = self._ensure_started()
+                for item in self._outbox.pending:
+                    self._enqueue(work_queue, item)
+        finally:
+            self._outbox.pending = None
+
+    def join(self) -> None:
+        """Blockiert, bis alle lokal veröffentlichten Nachrichten verarbeitet sind."""
+        self._ensure_started().join()
+
+    def shutdown(self, timeout: float = 8.0) -> None:
+        """
+        Beendet die Dispatcher und übergibt alle nicht zugestellten Nachrichten an den Fallback-Bus.
+
+        Wartende und auf einen neuen Versuch wartende Nachrichten werden sofort übergeben.
+        Laufende Handler erhalten bis zu `timeout` Sekunden; was sie danach noch
+        veröffentlichen, geht ebenfalls an den Fallback-Bus.
+        """
+        if self._pid != os.getpid():
+            return
+        with self._state_lock:
+            if self._closing:
+                return
+            self._closing = True
+            timers = list(self._timers.items())
+            self._timers.clear()
+            # Ein Endsignal pro Dispatcher hinter allen bereits wartenden Nachrichten.
+            for _ in self._threads:
+                self._queue.put(None)
+
+        for timer, (topic_id, message, _) in timers:
+            timer.cancel()
+            self._hand_off(topic_id, message, None)
+            self._queue.task_done()
+
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        logging.info(f"InMemoryBus beendet; {len(self.dead_letters)} Nachrichten nicht übergeben.")
+
+    def _enqueue(self, work_queue: queue.Queue, item: tuple) -> None:
+        with self._state_lock:
+            if not self._closing:
+                work_queue.put(item)
+                return
+        self._hand_off(item[0], item[1], None)
+
+    def _dispatch_loop(self, work_queue: queue.Queue) -> None:
+        while True:
+            item = work_queue.get()
+            if item is None:
+                work_queue.task_done()
+                return
+            topic_id, message, attempt = item
+            if self._closing:
+                self._hand_off(topic_id, message, None)
+                work_queue.task_done()
+                continue
+            retry_scheduled = False
+            try:
+                with self.deferred():
+                    self._subscribers[topic_id](message)
+            except ValueError as e:
+                # Ungültige Nachrichten werden auch durch Wiederholen nicht gültig.
+                logging.error(f"Lokale Nachricht an '{topic_id}' ist ungültig: {e}")
+                self._hand_off(topic_id, message, e)
+            except Exception as e:
+                if attempt < self.max_attempts:
+                    delay = min(self.max_retry_backoff, self.retry_backoff * 2 ** (attempt - 1))
+                    logging.warning(
+                        f"Lokale Zustellung an '{topic_id}' fehlgeschlagen (Versuch {attempt}), "
+                        f"neuer Versuch in {delay:.1f}s: {e}"
+                    )
+                    retry_scheduled = self._schedule_retry(work_queue, (topic_id, message, attempt + 1), delay)
+                else:
+                    logging.error(f"Lokale Zustellung an '{topic_id}' endgültig fehlgeschlagen: {e}", exc_info=True)
+                    self._hand_off(topic_id, message, e)
+            finally:
+                # Bei einem geplanten Versuch gilt die Nachricht erst nach dem erneuten
+                # Einreihen als erledigt, damit `join()` nicht vorzeitig zurückkehrt.
+                if not retry_scheduled:
+                    work_queue.task_done()
+
+    def _schedule_retry(self, work_queue: queue.Queue, item: tuple, delay: float) -> bool:
+        """
+        Plant einen neuen Versuch. Während des Shutdowns wird stattdessen sofort übergeben.
+
+        Returns:
+            True, wenn ein Versuch geplant wurde (die Nachricht bleibt bis dahin offen).
+        """
+        def requeue():
+            with self._state_lock:
+                # Ohne Eintrag hat `shutdown()` die Nachricht bereits übernommen.
+                if self._timers.pop(timer, None) is None:
+                    return
+            self._enqueue(work_queue, item)
+            work_queue.task_done()
+
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        with self._state_lock:
+            if not self._closing:
+                self._timers[timer] = item
+                timer.start()
+                return True
+        self._hand_off(item[0], item[1], None)
+        return False
+
+    def _hand_off(self, topic_id: str, message: Message, error: Optional[Exception]) -> None:
+        """Übergibt eine lokal nicht zustellbare Nachricht an das echte Topic (Retry-Policy, DLQ)."""
+        if self.fallback is None:
+            self.dead_letters.append((topic_id, message, error or IOError("bus shut down")))
+            return
+        try:
+            message_id = self.fallback.publish(topic_id, message)
+            logging.warning(f"Nachricht an '{topic_id}' als {message_id} an Pub/Sub übergeben.")
+        except Exception as e:
+            logging.error(f"Übergabe der Nachricht an '{topic_id}' an Pub/Sub fehlgeschlagen: {e}", exc_info=True)
+            self.dead_letters.append((topic_id, message, e))
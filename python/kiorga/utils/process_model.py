@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar('T')
+
+# Alle PerProcess-Instanzen, damit sie nach einem fork() im Kindprozess zurückgesetzt werden können.
+_PER_PROCESS_INSTANCES: "weakref.WeakSet[PerProcess]" = weakref.WeakSet()
+
+
+class PerProcess(Generic[T]):
+    """
+    Lazy erzeugtes, prozesslokales Objekt (z.B. ein gRPC-basierter Google-Cloud-Client).
+
+    gRPC-Clients wie `firestore.Client()` oder `pubsub_v1.PublisherClient()` sind nicht
+    fork-sicher. Ein `PerProcess` erzeugt das Objekt erst beim ersten Zugriff im jeweiligen
+    Worker-Prozess und verwirft geerbte Instanzen nach einem `fork()`. Attributzugriffe
+    werden an das Objekt weitergereicht, sodass ein `PerProcess` überall dort übergeben
+    werden kann, wo bisher der Client selbst verwendet wurde.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._instance: Optional[T] = None
+        self._pid: Optional[int] = None
+        _PER_PROCESS_INSTANCES.add(self)
+
+    def get(self) -> T:
+        """Gibt das Objekt des aktuellen Prozesses zurück und erzeugt es bei Bedarf."""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._instance = self._factory()
+                    self._pid = pid
+        return self._instance
+
+    def _reset(self) -> None:
+        # Ein zum Zeitpunkt des fork() gehaltener Lock bliebe im Kind für immer gesperrt.
+        self._lock = threading.Lock()
+        self._instance = None
+        self._pid = None
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            # Schützt vor Rekursion, z.B. beim Kopieren vor Aufruf von __init__.
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+
+def reset_per_process_state() -> None:
+    """Verwirft alle geerbten prozesslokalen Objekte. Wird nach jedem fork() im Kind aufgerufen."""
+    for instance in list(_PER_PROCESS_INSTANCES):
+        instance._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_per_process_state)
+
+
+# PID des Prozesses, in dem Cloud Logging eingerichtet wurde.
+_cloud_logging_pid: Optional[int] = None
+
+
+def setup_cloud_logging(log_level: int = logging.INFO, force: bool = False) -> None:
+    """
+    Richtet das strukturierte Logging für Google Cloud im aktuellen Prozess ein.
+
+    Der Logging-Client ist wie die übrigen gRPC-Clients nicht fork-sicher, und der
+    `CloudLoggingHandler` startet außerhalb von Cloud Run einen Transport-Thread, der im
+    Kindprozess fehlt. Unter gunicorn mit `preload_app` setzt gunicorn.conf.py daher
+    `CLOUD_LOGGING_PER_WORKER`: Der Aufruf beim Laden der App im Master wird übersprungen
+    und im `post_fork`-Hook jedes Workers mit `force=True` nachgeholt.
+    """
+    global _cloud_logging_pid
+    if os.environ.get("CLOUD_LOGGING_PER_WORKER") and not force:
+        return
+    if _cloud_logging_pid == os.getpid():
+        return
+    import google.cloud.logging
+
+    client = google.cloud.logging.Client()
+    client.setup_logging(log_level=log_level)
+    _cloud_logging_pid = os.getpid()
+
+
+def worker_slot() -> int:
+    """
+    Stabiler Index des aktuellen Worker-Prozesses (siehe gunicorn.conf.py).
+
+    Anders als die PID bleibt der Slot über Neustarts eines Workers gleich; prozesslokale
+    Dateien (z.B. ein DecisionLogStore) werden daher vom Nachfolger weiterverwendet.
+    Ohne Prozessmanager (z.B. ein einzelner Uvicorn-Prozess) ist der Slot 0.
+    """
+    return int(os.environ.get("WORKER_SLOT", "0"))
+
+
+def available_cpus() -> int:
+    """
+    Ermittelt die Anzahl nutzbarer vCPUs.
+
+    Berücksichtigt das CPU-Limit der cgroup (v2, z.B. Cloud Run), das `os.cpu_count()`
+    nicht widerspiegelt, sowie die CPU-Affinität des Prozesses.
+    """
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+class WorkerMetrics:
+    """
+    Prozesslokale Zähler, die über alle Worker eines Servers aggregiert werden können.
+
+    Jeder Worker zählt ausschließlich im eigenen Speicher (shared-nothing). Ein
+    Hintergrund-Thread schreibt geänderte Zähler alle `flush_interval` Sekunden in eine
+    eigene Datei im gemeinsamen Verzeichnis `directory`, auch wenn der Worker danach keine
+    Anfragen mehr erhält. `aggregate()` summiert die Dateien aller Worker. Ohne
+    Verzeichnis werden nur die Zähler des aktuellen Prozesses geliefert.
+    """
+
+    def __init__(self, directory: Optional[str] = None, flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._counters: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._changed = False
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            # Das Objekt entsteht über PerProcess erst im Worker; der Thread läuft daher dort.
+            threading.Thread(target=self._flush_loop, name="worker-metrics-flush", daemon=True).start()
+
+    def increment(self, name: str, value: float = 1.0) -> None:
+        """Erhöht einen Zähler (z.B. `requests_total` oder `processing_seconds_total`)."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0.0) + value
+            self._changed = True
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            if self._changed:
+                self.flush()
+
+    def snapshot(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._counters)
+
+    def flush(self) -> None:
+        """Schreibt die Zähler dieses Workers atomar in seine Datei."""
+        if not self.directory:
+            return
+        with self._lock:
+            self._changed = False
+        path = os.path.join(self.directory, f"worker-{os.getpid()}.json")
+        try:
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logging.warning(f"Konnte Metriken nicht nach {path} schreiben: {e}")
+
+    def aggregate(self) -> dict:
+        """
+        Summiert die Zähler aller Worker.
+
+        Dateien beendeter Worker bleiben erhalten, damit die Zähler über Worker-Neustarts
+        hinweg monoton bleiben. Die Zähler laufender Worker sind höchstens
+        `flush_interval` Sekunden alt.
+
+        Returns:
+            Ein Dictionary mit der Anzahl laufender Worker (`workers`), der Anzahl
+            berücksichtigter Worker-Dateien (`worker_files`, inkl. beendeter Worker) und
+            den summierten Zählern.
+        """
+        if not self.directory:
+            return {"workers": 1, "worker_files": 0, "counters": self.snapshot()}
+
+        self.flush()
+        totals: dict[str, float] = {}
+        files = 0
+        live = 0
+        for name in os.listdir(self.directory):
+            if not (name.startswith("worker-") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    counters = json.load(f)
+            except (OSError, ValueError):
+                continue
+            files += 1
+            if _is_running(int(name[len("worker-"):-len(".json")])):
+                live += 1
+            for key, value in counters.items():
+                totals[key] = totals.get(key, 0.0) + value
+        return {"workers": live, "worker_files": files, "counters": totals}
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Zähler des aktuellen Worker-Prozesses; das Verzeichnis setzt der Prozessmanager (gunicorn.conf.py).
+metrics: PerProcess[WorkerMetrics] = PerProcess(lambda: WorkerMetrics(os.environ.get("METRICS_DIR")))
@@ -89,4 +89,50 @@ def publish_proto_message_as_json(
         raise IOError(f"Pub/Sub API error on topic {topic_id}") from e
     except Exception as e:
         logging.error(f"Ein unerwarteter Fehler ist beim Veröffentlichen an Topic '{topic_id}' aufgetreten: {e}")
-        raise IOError(f"Unexpected error publishing to topic {topic_id}") from e
\ No newline at end of file
+        raise IOError(f"Unexpected error publishing to topic {topic_id}") from e
+
+
+def publish_proto_messages_as_json(
+    publisher: pubsub_v1.PublisherClient,
+    project_id: str,
+    topic_id: str,
+    proto_messages: list[Message],
+) -> list:
+    """
+    Veröffentlicht mehrere Protobuf-Nachrichten und wartet erst danach auf alle Ergebnisse.
+
+    Im Gegensatz zu wiederholten Aufrufen von `publish_proto_message_as_json` kann der
+    Publisher-Client die Nachrichten so zu wenigen Publish-Requests bündeln.
+
+    Args:
+        publisher: Eine Instanz des pubsub_v1.PublisherClient.
+        project_id: Die Google Cloud Projekt-ID.
+        topic_id: Die ID des Pub/Sub-Topics.
+        proto_messages: Die zu sendenden Protobuf-Nachrichten.
+
+    Returns:
+        Pro Nachricht (in gleicher Reihenfolge) die Message-ID oder die aufgetretene
+        Exception (IOError), damit Teilerfolge ausgewertet werden können.
+    """
+    topic_path = publisher.topic_path(project_id, topic_id)
+    futures = []
+    for proto_message in proto_messages:
+        try:
+            data_to_send = json_format.MessageToJson(proto_message).encode("utf-8")
+            futures.append(publisher.publish(topic_path, data=data_to_send))
+        except Exception as e:
+            futures.append(IOError(f"Unexpected error publishing to topic {topic_id}: {e}"))
+
+    results = []
+    for future in futures:
+        if isinstance(future, Exception):
+            results.append(future)
+            continue
+        try:
+            results.append(future.result(timeout=30))
+        except Exception as e:
+            logging.error(f"Fehler beim Veröffentlichen an Topic '{topic_id}': {e}")
+            results.append(IOError(f"Pub/Sub publish error on topic {topic_id}: {e}"))
+    published = sum(1 for result in results if not isinstance(result, Exception))
+    logging.info(f"{published}/{len(results)} Nachrichten an Topic '{topic_id}' veröffentlicht.")
+    return results
\ No newline at end of file
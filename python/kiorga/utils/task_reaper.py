@@ -0,0 +1,347 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from google.cloud import firestore
+
+from kiorga.datamodel import task_pb2
+from kiorga.utils.firestore_converters import message_from_firestore
+
+# Maximale Anzahl Schreiboperationen pro Firestore-Batch.
+FIRESTORE_BATCH_LIMIT = 500
+# Maximale Anzahl Werte eines `in`-Filters in Firestore.
+FIRESTORE_IN_LIMIT = 30
+
+# Gründe für eine Frist. Eine überfällige Bearbeitung wird erneut eingereiht,
+# ein überschrittenes Fälligkeitsdatum führt direkt zum Fehlschlag.
+DEADLINE_IN_PROGRESS = "in_progress_timeout"
+DEADLINE_DUE_DATE = "due_date"
+
+_ACTIVE_STATUSES = (
+    task_pb2.TaskStatus.TASK_STATUS_PENDING,
+    task_pb2.TaskStatus.TASK_STATUS_IN_PROGRESS,
+)
+
+
+def _last_update(data: dict) -> Optional[float]:
+    """
+    Liefert den letzten Änderungszeitpunkt eines Task-Dokuments als Unix-Zeit.
+
+    Alle Schreiber setzen `updatedAt`. Ältere Dokumente enthalten zusätzlich `updated_at`;
+    der Konverter übernähme dann den zufällig zuletzt gelesenen Schlüssel, der auch der
+    veraltete Zeitstempel des Erzeugers sein kann. Maßgeblich ist daher der jüngere Wert.
+    """
+    timestamps = [
+        value.timestamp()
+        for value in (data.get("updatedAt"), data.get("updated_at"))
+        if isinstance(value, datetime)
+    ]
+    return max(timestamps, default=None)
+
+
+class TaskReaper:
+    """
+    Überwacht laufende Tasks über einen Heap ihrer Fristen und behandelt überfällige Tasks.
+
+    Der Heap wird durch Statusübergänge gespeist: beim Start durch eine Abfrage auf aktive
+    Tasks (`status in [PENDING, IN_PROGRESS]`) und danach über einen Firestore-Snapshot-
+    Listener auf dieselbe Abfrage. Es findet kein periodischer Scan der `tasks`-Collection
+    statt; `reap()` betrachtet nur die Tasks an der Spitze des Heaps.
+
+    Fristen:
+    - IN_PROGRESS: `updatedAt` + `in_progress_timeout`. Überfällige Tasks werden bis zu
+      `max_requeues`-mal erneut an den ausführenden Agenten delegiert, danach FAILED.
+    - `due_date`: Ist es überschritten, wird der Task (PENDING oder IN_PROGRESS) FAILED.
+
+    Existiert für einen überfälligen Task bereits ein Abschlussbericht (`final_reports`),
+    ist nur das Setzen von COMPLETED fehlgeschlagen; der Task wird dann COMPLETED gesetzt
+    statt erneut delegiert oder FAILED.
+
+    Es darf nur eine Reaper-Instanz pro Projekt laufen (z.B. ein Worker, max. eine Instanz).
+    """
+
+    def __init__(
+        self,
+        db_client,
+        bus,
+        requeue_topic: str,
+        in_progress_timeout: float = 900.0,
+        max_requeues: int = 2,
+    ):
+        """
+        Args:
+            db_client: Firestore-Client.
+            bus: Nachrichtenbus für das erneute Delegieren (z.B. PubSubBus).
+            requeue_topic: Topic des ausführenden Agenten (z.B. TOPIC_SDA_BE_TASKS).
+            in_progress_timeout: Maximale Bearbeitungsdauer in Sekunden.
+            max_requeues: Anzahl erneuter Delegationen, bevor der Task FAILED wird.
+        """
+        self.db = db_client
+        self.bus = bus
+        self.requeue_topic = requeue_topic
+        self.in_progress_timeout = in_progress_timeout
+        self.max_requeues = max_requeues
+
+        self._lock = threading.Lock()
+        self._heap: list[tuple[float, int, str, str]] = []
+        self._entries: dict[str, tuple[float, int, str, str]] = {}
+        self._counter = itertools.count()
+        self._watch = None
+        self._ready = threading.Event()
+
+    # === Fristen verwalten ===
+
+    def track(self, task_id: str, deadline: float, reason: str) -> None:
+        """Setzt (oder ersetzt) die Frist eines Tasks."""
+        entry = (deadline, next(self._counter), task_id, reason)
+        with self._lock:
+            self._entries[task_id] = entry
+            heapq.heappush(self._heap, entry)
+
+    def untrack(self, task_id: str) -> None:
+        """Entfernt einen Task; der Heap-Eintrag wird beim nächsten Pop verworfen."""
+        with self._lock:
+            self._entries.pop(task_id, None)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def next_deadline(self) -> Optional[float]:
+        with self._lock:
+            self._discard_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def _discard_stale(self) -> None:
+        while self._heap and self._entries.get(self._heap[0][2]) is not self._heap[0]:
+            heapq.heappop(self._heap)
+
+    def _pop_overdue(self, now: float) -> list[tuple[str, str]]:
+        overdue = []
+        with self._lock:
+            self._discard_stale()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, task_id, reason = heapq.heappop(self._heap)
+                del self._entries[task_id]
+                overdue.append((task_id, reason))
+                self._discard_stale()
+        return overdue
+
+    def observe(self, task_id: str, data: dict, observed_at: float) -> None:
+        """
+        Aktualisiert die Frist eines Tasks aus seinem Firestore-Dokument.
+
+        Args:
+            task_id: Die Dokument-ID.
+            data: Das Firestore-Dokument.
+            observed_at: Zeitpunkt der Beobachtung; Basis der Bearbeitungsfrist, falls
+                         das Dokument keinen Änderungszeitpunkt enthält.
+        """
+        try:
+            task = message_from_firestore(data, task_pb2.Task)
+        except ValueError as e:
+            logging.warning(f"Task {task_id} konnte nicht gelesen werden und wird nicht überwacht: {e}")
+            self.untrack(task_id)
+            return
+
+        deadlines = []
+        if task.status == task_pb2.TaskStatus.TASK_STATUS_IN_PROGRESS:
+            started_at = _last_update(data) or observed_at
+            deadlines.append((started_at + self.in_progress_timeout, DEADLINE_IN_PROGRESS))
+        if task.status in _ACTIVE_STATUSES and task.HasField("due_date"):
+            deadlines.append((task.due_date.seconds + task.due_date.nanos / 1e9, DEADLINE_DUE_DATE))
+
+        if deadlines:
+            deadline, reason = min(deadlines)
+            self.track(task_id, deadline, reason)
+        else:
+            self.untrack(task_id)
+
+    # === Firestore-Anbindung ===
+
+    def _active_tasks_query(self):
+        # Enums stehen als Zahl in Firestore, ältere Dokumente enthalten noch den Namen.
+        statuses = list(_ACTIVE_STATUSES) + [task_pb2.TaskStatus.Name(status) for status in _ACTIVE_STATUSES]
+        return self.db.collection("tasks").where(filter=firestore.FieldFilter("status", "in", statuses))
+
+    def rebuild(self) -> int:
+        """
+        Baut den Heap aus allen aktiven Tasks in Firestore neu auf.
+
+        Returns:
+            Die Anzahl der überwachten Tasks.
+        """
+        now = time.time()
+        with self._lock:
+            self._heap.clear()
+            self._entries.clear()
+        try:
+            for snapshot in self._active_tasks_query().stream():
+                self.observe(snapshot.id, snapshot.to_dict() or {}, now)
+        except Exception as e:
+            logging.error(f"Fehler beim Aufbau der Task-Fristen aus Firestore: {e}", exc_info=True)
+            raise IOError("Firestore read error") from e
+        self._ready.set()
+        logging.info(f"TaskReaper überwacht {self.pending_count()} aktive Tasks.")
+        return self.pending_count()
+
+    def watch(self) -> None:
+        """
+        Abonniert Statusübergänge aktiver Tasks über einen Snapshot-Listener.
+
+        Der initiale Snapshot des Listeners enthält alle aktiven Tasks und ersetzt damit
+        `rebuild()`; ob er verarbeitet wurde, zeigt `wait_until_ready()`. Verlässt ein Task
+        die Abfrage (COMPLETED/FAILED), wird er entfernt.
+        """
+        def on_snapshot(_, changes, read_time):
+            observed_at = read_time.timestamp() if isinstance(read_time, datetime) else time.time()
+            for change in changes:
+                document = change.document
+                if change.type.name == "REMOVED":
+                    self.untrack(document.id)
+                else:
+                    self.observe(document.id, document.to_dict() or {}, observed_at)
+            self._ready.set()
+
+        self._ready.clear()
+        self._watch = self._active_tasks_query().on_snapshot(on_snapshot)
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wartet, bis der initiale Snapshot von `watch()` verarbeitet ist."""
+        return self._ready.wait(timeout)
+
+    def close(self) -> None:
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        self._ready = threading.Event()
+
+    # === Überfällige Tasks behandeln ===
+
+    def reap(self, now: Optional[float] = None) -> dict[str, int]:
+        """
+        Behandelt alle Tasks, deren Frist abgelaufen ist, gebündelt.
+
+        Der aktuelle Stand wird mit einem einzigen `get_all` gelesen; inzwischen
+        abgeschlossene Tasks werden übersprungen. Tasks mit vorhandenem Abschlussbericht
+        werden COMPLETED gesetzt. Erneute Delegationen werden mit `publish_many`
+        veröffentlicht, Statusänderungen per Firestore-Batch geschrieben.
+
+        Returns:
+            Zähler für `requeued`, `failed`, `completed` und `skipped`.
+        """
+        now = time.time() if now is None else now
+        overdue = dict(self._pop_overdue(now))
+        stats = {"requeued": 0, "failed": 0, "completed": 0, "skipped": 0}
+        if not overdue:
+            return stats
+
+        collection = self.db.collection("tasks")
+        try:
+            snapshots = list(self.db.get_all([collection.document(task_id) for task_id in overdue]))
+        except Exception as e:
+            # Fristen wiederherstellen, damit der nächste Lauf es erneut versucht.
+            for task_id, reason in overdue.items():
+                self.track(task_id, now, reason)
+            logging.error(f"Fehler beim Lesen überfälliger Tasks: {e}", exc_info=True)
+            raise IOError("Firestore read error") from e
+
+        active = []
+        for snapshot in snapshots:
+            data = snapshot.to_dict() if snapshot.exists else None
+            task = message_from_firestore(data, task_pb2.Task) if data else None
+            if task is None or task.status not in _ACTIVE_STATUSES:
+                stats["skipped"] += 1
+                continue
+            active.append((snapshot, data, task))
+
+        try:
+            reported = self._task_ids_with_final_report([snapshot.id for snapshot, _, _ in active])
+        except Exception as e:
+            for task_id, reason in overdue.items():
+                self.track(task_id, now, reason)
+            logging.error(f"Fehler beim Lesen der Abschlussberichte überfälliger Tasks: {e}", exc_info=True)
+            raise IOError("Firestore read error") from e
+
+        writes = []
+        to_requeue, to_fail = [], []
+        for snapshot, data, task in active:
+            if snapshot.id in reported:
+                # Der Agent hat den Task abgeschlossen, nur das Setzen des Status ging verloren.
+                writes.append((snapshot.reference, {
+                    "status": task_pb2.TaskStatus.TASK_STATUS_COMPLETED,
+                    "updatedAt": firestore.SERVER_TIMESTAMP,
+                }))
+                stats["completed"] += 1
+                continue
+            reason = overdue[snapshot.id]
+            if reason == DEADLINE_IN_PROGRESS and data.get("reaperRequeues", 0) < self.max_requeues:
+                to_requeue.append((snapshot.reference, task))
+            else:
+                failure = "Fälligkeitsdatum überschritten" if reason == DEADLINE_DUE_DATE else "Bearbeitungszeit überschritten"
+                to_fail.append((snapshot.reference, failure))
+
+        if to_requeue:
+            publish_results = self.bus.publish_many(self.requeue_topic, [task for _, task in to_requeue])
+            for (doc_ref, task), result in zip(to_requeue, publish_results):
+                if isinstance(result, Exception):
+                    logging.warning(f"Task {task.task_id} konnte nicht erneut delegiert werden: {result}")
+                    self.track(task.task_id, now + 60, DEADLINE_IN_PROGRESS)
+                    continue
+                writes.append((doc_ref, {"reaperRequeues": firestore.Increment(1), "updatedAt": firestore.SERVER_TIMESTAMP}))
+                # Der Listener liefert das neue `updatedAt`; bis dahin gilt die neue Frist ab jetzt.
+                self.track(task.task_id, now + self.in_progress_timeout, DEADLINE_IN_PROGRESS)
+                stats["requeued"] += 1
+
+        for doc_ref, failure in to_fail:
+            writes.append((doc_ref, {
+                "status": task_pb2.TaskStatus.TASK_STATUS_FAILED,
+                "failureReason": failure,
+                "updatedAt": firestore.SERVER_TIMESTAMP,
+            }))
+            stats["failed"] += 1
+
+        try:
+            for start in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+                batch = self.db.batch()
+                for doc_ref, update_data in writes[start:start + FIRESTORE_BATCH_LIMIT]:
+                    batch.update(doc_ref, update_data)
+                batch.commit()
+        except Exception as e:
+            for task_id, reason in overdue.items():
+                with self._lock:
+                    tracked = task_id in self._entries
+                if not tracked:
+                    self.track(task_id, now + 60, reason)
+            logging.error(f"Fehler beim Aktualisieren überfälliger Tasks: {e}", exc_info=True)
+            raise IOError("Firestore batch write error") from e
+
+        logging.info(f"TaskReaper: {stats} ({len(overdue)} überfällige Tasks).")
+        return stats
+
+    def _task_ids_with_final_report(self, task_ids: list[str]) -> set[str]:
+        """Ermittelt per `in`-Abfrage (je 30 IDs), für welche Tasks ein Abschlussbericht existiert."""
+        reported = set()
+        reports = self.db.collection("final_reports")
+        for start in range(0, len(task_ids), FIRESTORE_IN_LIMIT):
+            chunk = task_ids[start:start + FIRESTORE_IN_LIMIT]
+            query = reports.where(filter=firestore.FieldFilter("taskId", "in", chunk)).select(["taskId"])
+            for snapshot in query.stream():
+                reported.add((snapshot.to_dict() or {}).get("taskId"))
+        return reported
+
+    def run_forever(self, interval: float = 30.0, stop: Optional[threading.Event] = None) -> None:
+        """Ruft `reap()` regelmäßig auf, spätestens zur nächsten Frist."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self.reap()
+            except Exception as e:
+                logging.error(f"TaskReaper-Lauf fehlgeschlagen: {e}", exc_info=True)
+            next_deadline = self.next_deadline()
+            wait = interval if next_deadline is None else min(interval, max(0.0, next_deadline - time.time()))
+            stop.wait(max(wait, 1.0))
@@ -29,6 +29,29 @@ def parse_and_validate_message(
 
     return message_instance
 
+def parse_and_validate_dict(
+    data: dict,
+    message_class: Type[T],
+    validator_func: Optional[Callable[[T], List[str]]] = None
+) -> T:
+    """
+    Wie `parse_and_validate_message`, jedoch für bereits geparstes JSON (z.B. ein Element
+    einer Batch-Anfrage), ohne den Umweg über einen JSON-String.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"{message_class.__name__} must be a JSON object, got {type(data).__name__}")
+    try:
+        message_instance = message_class()
+        json_format.ParseDict(data, message_instance)
+    except (json_format.ParseError, TypeError) as e:
+        raise ValueError(f"protobuf parse error for {message_class.__name__}: {e}") from e
+
+    if validator_func and (errors := validator_func(message_instance)):
+        error_msg = f"Validierung für {message_class.__name__} fehlgeschlagen. Fehlerhafte Felder: {errors}"
+        raise ValueError(error_msg)
+
+    return message_instance
+
 def validate_task(task: task_pb2.Task) -> list[str]:
     """
     Prüft, ob die Pflichtfelder im Task-Objekt für eine gültige Verarbeitung gesetzt sind.
@@ -0,0 +1,65 @@
+import argparse
+import logging
+import os
+
+from dotenv import load_dotenv
+from google.cloud import pubsub_v1
+
+from kiorga.datamodel import final_report_pb2, task_pb2
+from kiorga.utils.dlq_replay import DlqReplayer
+from kiorga.utils.validation import validate_task
+
+# Lädt die Umgebungsvariablen aus der .env-Datei im Root-Verzeichnis
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# --- Konfiguration ---
+PROJECT_ID = os.getenv("GCP_PROJECT")
+
+# DLQ -> (Umgebungsvariable des Ziel-Topics, Nachrichtentyp, Validator wie im konsumierenden Service)
+DLQ_TARGETS = {
+    "lda_tasks_dlq": ("TOPIC_LDA_TASKS", task_pb2.Task, validate_task),
+    "sda_be_tasks_dlq": ("TOPIC_SDA_BE_TASKS", task_pb2.Task, None),
+    "final_reports_dlq": ("TOPIC_REPORTS", final_report_pb2.FinalReport, None),
+}
+# ---------------------
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Veröffentlicht reparierbare Nachrichten aus einer DLQ erneut.")
+    parser.add_argument("dlq", choices=sorted(DLQ_TARGETS), help="Name des Dead-Letter-Topics")
+    parser.add_argument("--subscription", help="Abonnement auf der DLQ (Standard: '<dlq>-sub')")
+    parser.add_argument("--rate", type=float, default=100.0, help="Maximale Veröffentlichungen pro Sekunde")
+    parser.add_argument("--workers", type=int, default=16, help="Anzahl paralleler Worker")
+    parser.add_argument("--max-messages", type=int, help="Nach dieser Anzahl Nachrichten abbrechen")
+    parser.add_argument("--checkpoint", help="Checkpoint-Datei (Standard: '<dlq>.checkpoint.json')")
+    parser.add_argument("--parked", help="JSONL-Datei für nicht reparierbare Nachrichten (Standard: '<dlq>.parked.jsonl')")
+    parser.add_argument("--dry-run", action="store_true", help="Nur klassifizieren, nichts veröffentlichen oder bestätigen")
+    args = parser.parse_args()
+
+    topic_env, message_class, validator_func = DLQ_TARGETS[args.dlq]
+    target_topic = os.getenv(topic_env)
+    if not all([PROJECT_ID, target_topic]):
+        raise EnvironmentError(f"Fehlende Umgebungsvariablen: GCP_PROJECT, {topic_env} müssen gesetzt sein.")
+
+    replayer = DlqReplayer(
+        subscriber=pubsub_v1.SubscriberClient(),
+        publisher=pubsub_v1.PublisherClient(),
+        project_id=PROJECT_ID,
+        subscription_id=args.subscription or f"{args.dlq}-sub",
+        target_topic=target_topic,
+        message_class=message_class,
+        validator_func=validator_func,
+        rate=args.rate,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint or f"{args.dlq}.checkpoint.json",
+        parked_path=args.parked or f"{args.dlq}.parked.jsonl",
+        dry_run=args.dry_run,
+    )
+    stats = replayer.run(max_messages=args.max_messages)
+    print(f"\nDLQ-Replay für '{args.dlq}' abgeschlossen: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,12 @@
 import os
 import logging
-import google.cloud.logging
 from google.cloud import firestore
 from google.cloud import pubsub_v1
 from dotenv import load_dotenv
 
 from service import TaskHandler
 from kiorga.utils.fastapi_factory import create_app
+from kiorga.utils.process_model import PerProcess, setup_cloud_logging
 
 # Lädt die Umgebungsvariablen aus der .env-Datei im Root-Verzeichnis
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
@@ -15,13 +15,14 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '..', '.en
 # Richtet das strukturierte Logging für Google Cloud ein.
 # Dies sorgt dafür, dass Logs als JSON-Payloads gesendet werden, was die
 # Filterung und Analyse in der Google Cloud Console erheblich verbessert.
-client = google.cloud.logging.Client()
-client.setup_logging(log_level=logging.INFO)
+# Unter gunicorn erst im jeweiligen Worker (siehe setup_cloud_logging).
+setup_cloud_logging(log_level=logging.INFO)
 
 # === Globale Clients und Konfiguration ===
 try:
-    db = firestore.Client()
-    publisher = pubsub_v1.PublisherClient()
+    # gRPC-Clients sind nicht fork-sicher und werden daher erst im jeweiligen Worker erzeugt.
+    db = PerProcess(firestore.Client)
+    publisher = PerProcess(pubsub_v1.PublisherClient)
 
     PROJECT_ID = os.environ["GCP_PROJECT"]
     DELEGATION_TOPIC = os.environ["TOPIC_SDA_BE_TASKS"]
@@ -39,7 +40,9 @@ task_handler = TaskHandler(
 )
 
 # === FastAPI-Anwendung über Factory erstellen ===
-app = create_app(service_handler=task_handler, process_method_name="handle_task")
+app = create_app(service_handler=task_handler, process_method_name="handle_task", batch_method_name="handle_task_batch")
 
 # Um die Anwendung zu starten, verwenden Sie:
 # uvicorn main:app --host 0.0.0.0 --port 8080
+# Multi-Worker-Betrieb (ein Worker pro vCPU, siehe python/gunicorn.conf.py):
+# gunicorn -c ../../gunicorn.conf.py main:app
@@ -1,20 +1,26 @@
 ## Imports
+import json
 import logging
 import time
 
 from google.cloud import firestore
-from google.protobuf import json_format
 
 from kiorga.datamodel import task_pb2
-from kiorga.utils.validation import parse_and_validate_message, validate_task
-from kiorga.utils.pubsub_helpers import decode_pubsub_message, publish_proto_message_as_json
+from kiorga.utils.firestore_converters import message_to_firestore
+from kiorga.utils.validation import parse_and_validate_dict, parse_and_validate_message, validate_task
+from kiorga.utils.message_bus import PubSubBus
+from kiorga.utils.pubsub_helpers import decode_pubsub_message
+
+# Maximale Anzahl Schreiboperationen pro Firestore-Batch.
+FIRESTORE_BATCH_LIMIT = 500
+
 
 class TaskHandler:
     """
     Kapselt die Geschäftslogik für die Verarbeitung von Tasks.
     """
 
-    def __init__(self, db_client, pub_client, project_id: str, delegation_topic: str, assigned_agent_id: str):
+    def __init__(self, db_client, pub_client, project_id: str, delegation_topic: str, assigned_agent_id: str, bus=None):
         """
         Initialisiert den TaskHandler mit den erforderlichen Clients und Konfigurationen.
 
@@ -24,18 +30,19 @@ class TaskHandler:
             project_id: Google Cloud Projekt-ID.
             delegation_topic: Name des Pub/Sub-Topics für die Delegierung.
             assigned_agent_id: ID des Agenten, an den die Aufgabe delegiert wird.
+            bus: Optionaler Nachrichtenbus (z.B. InMemoryBus); Standard ist Pub/Sub.
         """
         self.db = db_client
         self.publisher = pub_client
         self.project_id = project_id
         self.delegation_topic = delegation_topic
         self.assigned_agent_id = assigned_agent_id
+        self.bus = bus or PubSubBus(pub_client, project_id)
 
     def handle_task(self, envelope: dict) -> None:
         """
-        Orchestriert den gesamten Prozess der Task-Verarbeitung.
+        Dekodiert und validiert einen Task aus einer Pub/Sub-Nachricht und verarbeitet ihn.
         """
-        start_time = time.time()
         try:
             json_string_received, publish_timestamp = decode_pubsub_message(envelope)
             # receive_latency = time.time() - publish_timestamp # Metrik entfernt
@@ -45,7 +52,20 @@ class TaskHandler:
                 message_class=task_pb2.Task,
                 validator_func=validate_task
             )
+        except Exception as e:
+            logging.error(f"Fehler bei der Task-Verarbeitung: {e}", exc_info=True)
+            raise  # Fehler weiterleiten
 
+        self.process_task(task)
+
+    def process_task(self, task: task_pb2.Task) -> None:
+        """
+        Orchestriert den gesamten Prozess der Task-Verarbeitung.
+
+        Wird direkt vom InMemoryBus mit dem Protobuf-Objekt aufgerufen.
+        """
+        start_time = time.time()
+        try:
             doc_ref, should_process = self._save_task_to_firestore(task)
             if not should_process:
                 return  # Idempotenter Abbruch
@@ -59,10 +79,115 @@ class TaskHandler:
             logging.error(f"Fehler bei der Task-Verarbeitung: {e}", exc_info=True)
             raise  # Fehler weiterleiten
 
+    def handle_task_batch(self, payload: dict) -> list[dict]:
+        """
+        Verarbeitet viele Tasks (z.B. Sub-Tasks eines Planers) in einem Durchgang.
+
+        Der Payload ist `{"tasks": [<Task als JSON>, ...]}`, direkt oder als Pub/Sub-Envelope.
+        Alle Tasks werden in einem Durchlauf validiert, mit einem `get_all` auf Idempotenz
+        geprüft, mit Firestore-Batches gespeichert, gebündelt delegiert und anschließend
+        wieder per Batch als zugewiesen markiert. Fehler einzelner Tasks brechen den Batch
+        nicht ab, sondern erscheinen im Ergebnis.
+
+        Returns:
+            Ein Ergebnis pro Eingabeelement (gleiche Reihenfolge) mit `task_id`, `status`
+            (`delegated`, `skipped`, `duplicate`, `invalid` oder `failed`) und ggf. `error`.
+
+        Raises:
+            ValueError: Wenn der Payload kein gültiger Batch ist.
+            IOError: Wenn Firestore für den gesamten Batch nicht erreichbar ist.
+        """
+        if "message" in payload:
+            json_string_received, _ = decode_pubsub_message(payload)
+            try:
+                payload = json.loads(json_string_received)
+            except json.JSONDecodeError as e:
+                raise ValueError("batch payload is not valid JSON") from e
+        items = payload.get("tasks") if isinstance(payload, dict) else None
+        if not isinstance(items, list) or not items:
+            raise ValueError("batch payload requires a non-empty 'tasks' list")
+
+        start_time = time.time()
+        results: list[dict] = [{} for _ in items]
+        tasks: dict[str, tuple[int, task_pb2.Task]] = {}
+
+        # 1. Validierung in einem Durchlauf; Duplikate innerhalb des Batches nur einmal verarbeiten.
+        for index, item in enumerate(items):
+            try:
+                task = parse_and_validate_dict(item, task_pb2.Task, validate_task)
+            except ValueError as e:
+                task_id = item.get("taskId", "") if isinstance(item, dict) else ""
+                results[index] = {"task_id": task_id, "status": "invalid", "error": str(e)}
+                continue
+            if task.task_id in tasks:
+                results[index] = {"task_id": task.task_id, "status": "duplicate"}
+                continue
+            tasks[task.task_id] = (index, task)
+
+        # 2. Idempotenz: bereits zugewiesene Tasks mit einem einzigen Lesezugriff ermitteln.
+        collection = self.db.collection("tasks")
+        doc_refs = {task_id: collection.document(task_id) for task_id in tasks}
+        try:
+            for snapshot in self.db.get_all(list(doc_refs.values()), field_paths=["assignedToAgentId"]):
+                assigned_to = snapshot.exists and (snapshot.to_dict() or {}).get("assignedToAgentId")
+                if assigned_to:
+                    index, _ = tasks.pop(snapshot.id)
+                    results[index] = {"task_id": snapshot.id, "status": "skipped", "error": f"bereits an {assigned_to} zugewiesen"}
+        except Exception as e:
+            logging.error(f"Fehler beim Lesen der Tasks aus Firestore: {e}", exc_info=True)
+            raise IOError("Firestore read error") from e
+
+        # 3. Speichern per Firestore-Batch.
+        self._commit_in_batches(
+            [(doc_refs[task_id], message_to_firestore(task)) for task_id, (_, task) in tasks.items()],
+            merge=True,
+        )
+
+        # 4. Gebündelte Delegation.
+        task_list = [task for _, task in tasks.values()]
+        publish_results = self.bus.publish_many(self.delegation_topic, task_list) if task_list else []
+        delegated = []
+        for task, publish_result in zip(task_list, publish_results):
+            index, _ = tasks[task.task_id]
+            if isinstance(publish_result, Exception):
+                results[index] = {"task_id": task.task_id, "status": "failed", "error": str(publish_result)}
+            else:
+                results[index] = {"task_id": task.task_id, "status": "delegated"}
+                delegated.append(task.task_id)
+
+        # 5. Zuweisung der erfolgreich delegierten Tasks per Batch-Update.
+        update_data = {
+            "status": task_pb2.TaskStatus.TASK_STATUS_IN_PROGRESS,
+            "assignedToAgentId": self.assigned_agent_id,
+            "updatedAt": firestore.SERVER_TIMESTAMP
+        }
+        self._commit_in_batches([(doc_refs[task_id], update_data) for task_id in delegated], update=True)
+
+        logging.info(
+            f"Batch mit {len(items)} Tasks verarbeitet: {len(delegated)} delegiert "
+            f"in {time.time() - start_time:.4f} Sekunden."
+        )
+        return results
+
+    def _commit_in_batches(self, writes: list, merge: bool = False, update: bool = False) -> None:
+        """Schreibt (doc_ref, data)-Paare in Firestore-Batches zu je höchstens 500 Operationen."""
+        try:
+            for start in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+                batch = self.db.batch()
+                for doc_ref, data in writes[start:start + FIRESTORE_BATCH_LIMIT]:
+                    if update:
+                        batch.update(doc_ref, data)
+                    else:
+                        batch.set(doc_ref, data, merge=merge)
+                batch.commit()
+        except Exception as e:
+            logging.error(f"Fehler beim Batch-Schreiben in Firestore: {e}", exc_info=True)
+            raise IOError("Firestore batch write error") from e
+
     def _save_task_to_firestore(self, task: task_pb2.Task) -> tuple[firestore.DocumentReference, bool]:
         """Speichert den Task in Firestore und prüft auf Idempotenz."""
         try:
-            task_dict = json_format.MessageToDict(task)
+            task_dict = message_to_firestore(task)
             doc_ref = self.db.collection("tasks").document(task.task_id)
 
             task_snapshot = doc_ref.get()
@@ -85,12 +210,7 @@ class TaskHandler:
 
         logging.info(f"Delegating task {task.task_id} to {self.assigned_agent_id} via topic '{self.delegation_topic}'...")
         try:
-            publish_proto_message_as_json(
-                publisher=self.publisher,
-                project_id=self.project_id,
-                topic_id=self.delegation_topic,
-                proto_message=task
-            )
+            self.bus.publish(self.delegation_topic, task)
         except Exception as e:
             logging.error(f"Fehler beim Delegieren des Tasks an Pub/Sub: {e}", exc_info=True)
             raise IOError("Pub/Sub publish error") from e
@@ -101,7 +221,7 @@ class TaskHandler:
             update_data = {
                 "status": task_pb2.TaskStatus.TASK_STATUS_IN_PROGRESS,
                 "assignedToAgentId": self.assigned_agent_id,
-                "updated_at": firestore.SERVER_TIMESTAMP
+                "updatedAt": firestore.SERVER_TIMESTAMP
             }
             doc_ref.update(update_data)
             logging.info(f"Task {task_id} status updated to IN_PROGRESS and assigned to {self.assigned_agent_id}.")
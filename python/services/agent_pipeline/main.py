@@ -0,0 +1,123 @@
+import importlib.util
+import os
+import logging
+
+from google.cloud import firestore
+from google.cloud import pubsub_v1
+from dotenv import load_dotenv
+
+from kiorga.storage.result_cache import result_cache_from_env
+from kiorga.utils.fastapi_factory import create_app
+from kiorga.utils.message_bus import InMemoryBus, PubSubBus
+from kiorga.utils.process_model import PerProcess, setup_cloud_logging
+
+# Lädt die Umgebungsvariablen aus der .env-Datei im Root-Verzeichnis
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
+
+# === Logging-Konfiguration ===
+# Unter gunicorn erst im jeweiligen Worker (siehe setup_cloud_logging).
+setup_cloud_logging(log_level=logging.INFO)
+
+SERVICES_DIR = os.path.join(os.path.dirname(__file__), '..')
+
+
+def _load_service_module(service_name: str):
+    """Lädt die service.py eines Agenten unter eindeutigem Modulnamen (alle heißen `service`)."""
+    spec = importlib.util.spec_from_file_location(
+        f"{service_name}_service", os.path.join(SERVICES_DIR, service_name, "service.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class _DeferredEntrypoint:
+    """
+    Einstiegspunkt für Pub/Sub-Push-Nachrichten an den ersten lokalen Agenten.
+
+    Lokale Folgenachrichten werden erst nach erfolgreicher Verarbeitung zugestellt
+    (siehe `InMemoryBus.deferred`).
+    """
+
+    def __init__(self, bus: InMemoryBus, handler):
+        self.bus = bus
+        self.handler = handler
+
+    def handle_task(self, envelope: dict) -> None:
+        with self.bus.deferred():
+            self.handler.handle_task(envelope)
+
+    def handle_task_batch(self, payload: dict) -> list[dict]:
+        with self.bus.deferred():
+            return self.handler.handle_task_batch(payload)
+
+
+# === Globale Clients und Konfiguration ===
+try:
+    # gRPC-Clients sind nicht fork-sicher und werden daher erst im jeweiligen Worker erzeugt.
+    db = PerProcess(firestore.Client)
+    publisher = PerProcess(pubsub_v1.PublisherClient)
+
+    PROJECT_ID = os.environ["GCP_PROJECT"]
+    TOPIC_LDA_TASKS = os.environ["TOPIC_LDA_TASKS"]
+    TOPIC_SDA_BE_TASKS = os.environ["TOPIC_SDA_BE_TASKS"]
+    TOPIC_REPORTS = os.environ["TOPIC_REPORTS"]
+    AGENT_ID_SDA_BE = os.environ["AGENT_ID_SDA_BE"]
+except KeyError as e:
+    raise EnvironmentError(f"Fehlende Umgebungsvariable: {e}") from e
+
+# Agenten, die in diesem Prozess laufen. Nachrichten an alle anderen Topics gehen über Pub/Sub.
+LOCAL_AGENTS = [name.strip() for name in os.environ.get("LOCAL_AGENTS", "agent_lda,agent_sda_be").split(",") if name.strip()]
+
+# Ergebnis-Cache für identische Tasks (lokal pro Worker + gemeinsam in Firestore).
+# RESULT_CACHE_TTL_SECONDS=0 deaktiviert den Cache.
+result_cache = result_cache_from_env(db)
+
+# === Service-Layer Initialisierung ===
+bus = InMemoryBus(fallback=PubSubBus(publisher, PROJECT_ID))
+handlers = []
+
+if "agent_lda" in LOCAL_AGENTS:
+    lda_handler = _load_service_module("agent_lda").TaskHandler(
+        db_client=db,
+        pub_client=publisher,
+        project_id=PROJECT_ID,
+        delegation_topic=TOPIC_SDA_BE_TASKS,
+        assigned_agent_id=AGENT_ID_SDA_BE,
+        bus=bus
+    )
+    bus.subscribe(TOPIC_LDA_TASKS, lda_handler.process_task)
+    handlers.append(lda_handler)
+
+if "agent_sda_be" in LOCAL_AGENTS:
+    sda_be_handler = _load_service_module("agent_sda_be").TaskHandler(
+        db_client=db,
+        pub_client=publisher,
+        project_id=PROJECT_ID,
+        agent_id=AGENT_ID_SDA_BE,
+        reports_topic=TOPIC_REPORTS,
+        bus=bus,
+        result_cache=result_cache
+    )
+    bus.subscribe(TOPIC_SDA_BE_TASKS, sda_be_handler.process_task)
+    handlers.append(sda_be_handler)
+
+if not handlers:
+    raise EnvironmentError(f"LOCAL_AGENTS enthält keinen bekannten Agenten: {LOCAL_AGENTS}")
+
+logging.info(f"Agent-Pipeline gestartet mit lokalen Agenten: {LOCAL_AGENTS}")
+
+# === FastAPI-Anwendung über Factory erstellen ===
+# Pub/Sub-Push-Nachrichten gehen an den ersten lokalen Agenten der Kette.
+# Die Folge-Agenten laufen erst nach der Antwort (204) im Hintergrund: Der Service braucht
+# daher dauerhaft zugewiesene CPU (Cloud Run: `--no-cpu-throttling`). Beim Beenden gibt
+# `bus.shutdown` alle noch nicht zugestellten Nachrichten an Pub/Sub ab.
+app = create_app(
+    service_handler=_DeferredEntrypoint(bus, handlers[0]),
+    process_method_name="handle_task",
+    batch_method_name="handle_task_batch" if hasattr(handlers[0], "handle_task_batch") else None,
+    on_shutdown=bus.shutdown
+)
+
+# Um die Anwendung zu starten, verwenden Sie:
+# uvicorn main:app --host 0.0.0.0 --port 8080
@@ -1,26 +1,29 @@
 import os
 import logging
-import google.cloud.logging
 
 from google.cloud import firestore
 from google.cloud import pubsub_v1
 from dotenv import load_dotenv
 
 from service import TaskHandler
+from kiorga.storage.decision_log_store import DecisionLogStore
+from kiorga.storage.result_cache import result_cache_from_env
 from kiorga.utils.fastapi_factory import create_app
+from kiorga.utils.process_model import PerProcess, setup_cloud_logging, worker_slot
 
 # Lädt die Umgebungsvariablen aus der .env-Datei im Root-Verzeichnis
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
 
 # === Logging-Konfiguration ===
 # Richtet das strukturierte Logging für Google Cloud ein.
-client = google.cloud.logging.Client()
-client.setup_logging(log_level=logging.INFO)
+# Unter gunicorn erst im jeweiligen Worker (siehe setup_cloud_logging).
+setup_cloud_logging(log_level=logging.INFO)
 
 # === Globale Clients und Konfiguration ===
 try:
-    db = firestore.Client()
-    publisher = pubsub_v1.PublisherClient()
+    # gRPC-Clients sind nicht fork-sicher und werden daher erst im jeweiligen Worker erzeugt.
+    db = PerProcess(firestore.Client)
+    publisher = PerProcess(pubsub_v1.PublisherClient)
 
     PROJECT_ID = os.environ["GCP_PROJECT"]
     AGENT_ID = os.environ["AGENT_ID_SDA_BE"]
@@ -28,13 +31,27 @@ try:
 except KeyError as e:
     raise EnvironmentError(f"Fehlende Umgebungsvariable: {e}") from e
 
+# Optional: Entscheidungen lokal in Segmentdateien protokollieren.
+# Jeder Worker-Prozess schreibt in ein eigenes Unterverzeichnis (shared-nothing); über den
+# stabilen Worker-Slot öffnet ein neu gestarteter Worker den Store seines Vorgängers.
+DECISION_LOG_DIR = os.environ.get("DECISION_LOG_DIR")
+decision_log = PerProcess(
+    lambda: DecisionLogStore(os.path.join(DECISION_LOG_DIR, f"worker-{worker_slot()}"), compaction_interval=300)
+) if DECISION_LOG_DIR else None
+
+# Ergebnis-Cache für identische Tasks (lokal pro Worker + gemeinsam in Firestore).
+# RESULT_CACHE_TTL_SECONDS=0 deaktiviert den Cache.
+result_cache = result_cache_from_env(db)
+
 # === Service-Layer Initialisierung ===
 task_handler = TaskHandler(
     db_client=db,
     pub_client=publisher,
     project_id=PROJECT_ID,
     agent_id=AGENT_ID,
-    reports_topic=REPORTS_TOPIC
+    reports_topic=REPORTS_TOPIC,
+    decision_log=decision_log,
+    result_cache=result_cache
 )
 
 # === FastAPI-Anwendung über Factory erstellen ===
@@ -42,3 +59,5 @@ app = create_app(service_handler=task_handler, process_method_name="handle_task"
 
 # Um die Anwendung zu starten, verwenden Sie:
 # uvicorn main:app --host 0.0.0.0 --port 8080
+# Multi-Worker-Betrieb (ein Worker pro vCPU, siehe python/gunicorn.conf.py):
+# gunicorn -c ../../gunicorn.conf.py main:app
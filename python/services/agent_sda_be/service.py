@@ -2,11 +2,13 @@ import logging
 import time
 import uuid
 
-from google.protobuf import json_format
 from google.protobuf.timestamp_pb2 import Timestamp
 
-from kiorga.datamodel import final_report_pb2, task_pb2
-from kiorga.utils.pubsub_helpers import decode_pubsub_message, publish_proto_message_as_json
+from kiorga.datamodel import decision_log_pb2, final_report_pb2, task_pb2
+from kiorga.storage.result_cache import is_cacheable, task_fingerprint
+from kiorga.utils.firestore_converters import message_to_firestore
+from kiorga.utils.message_bus import PubSubBus
+from kiorga.utils.pubsub_helpers import decode_pubsub_message
 from kiorga.utils.validation import parse_and_validate_message
 
 
@@ -15,35 +17,65 @@ class TaskHandler:
     Kapselt die Geschäftslogik für die Verarbeitung von Tasks durch den SDA-BE-Agenten.
     """
 
-    def __init__(self, db_client, pub_client, project_id: str, agent_id: str, reports_topic: str):
+    def __init__(self, db_client, pub_client, project_id: str, agent_id: str, reports_topic: str, decision_log=None, bus=None, result_cache=None):
         self.db = db_client
         self.publisher = pub_client
         self.project_id = project_id
         self.agent_id = agent_id
         self.reports_topic = reports_topic
+        # Nachrichtenbus für Folgenachrichten; Standard ist Pub/Sub, im Pipeline-Betrieb der InMemoryBus.
+        self.bus = bus or PubSubBus(pub_client, project_id)
+        # Optionaler DecisionLogStore; ohne Store werden keine Entscheidungen protokolliert.
+        self.decision_log = decision_log
+        # Optionaler ResultCache; identische Tasks übernehmen dann das zwischengespeicherte Ergebnis.
+        self.result_cache = result_cache
 
     def handle_task(self, envelope: dict):
+        """
+        Dekodiert einen Task aus einer Pub/Sub-Nachricht und verarbeitet ihn.
+        """
+        json_string_received, publish_timestamp = decode_pubsub_message(envelope)
+        # receive_latency = time.time() - publish_timestamp # Metrik entfernt
+
+        task = parse_and_validate_message(
+            json_string=json_string_received,
+            message_class=task_pb2.Task
+        )
+        self.process_task(task)
+
+    def process_task(self, task: task_pb2.Task):
         """
         Orchestriert den gesamten Prozess der Task-Verarbeitung.
+
+        Wird direkt vom InMemoryBus mit dem Protobuf-Objekt aufgerufen.
         """
-        task = None
         start_time = time.time()
         try:
-            json_string_received, publish_timestamp = decode_pubsub_message(envelope)
-            # receive_latency = time.time() - publish_timestamp # Metrik entfernt
-
-            task = parse_and_validate_message(
-                json_string=json_string_received,
-                message_class=task_pb2.Task
-            )
             logging.info(f"SDA-BE received task: id={task.task_id}, title='{task.title}'")
 
             if self._check_idempotency(task.task_id):
                 return
 
             self._update_task_status(task.task_id, task_pb2.TaskStatus.TASK_STATUS_IN_PROGRESS)
-            self._perform_simulated_work(task.task_id)
-            self._create_and_publish_final_report(task.task_id)
+            cache_key = self._result_cache_key(task)
+            cached_report = self.result_cache.get(cache_key) if cache_key else None
+            if cached_report is not None:
+                self._log_decision(
+                    task.task_id,
+                    decision="Übernehme das Ergebnis eines identischen Tasks aus dem Ergebnis-Cache.",
+                    reasoning="Titel, Beschreibung, Eingaben und Erfolgskriterien entsprechen einem bereits bearbeiteten Task.",
+                )
+                self._create_and_publish_final_report(task.task_id, template=cached_report)
+            else:
+                self._log_decision(
+                    task.task_id,
+                    decision="Starte simulierte Bearbeitung des Tasks.",
+                    reasoning="Für den Task existiert noch kein Abschlussbericht.",
+                )
+                self._perform_simulated_work(task.task_id)
+                final_report = self._create_and_publish_final_report(task.task_id)
+                if cache_key and final_report.final_status == final_report_pb2.FinalStatus.FINAL_STATUS_SUCCESS:
+                    self.result_cache.put(cache_key, final_report, source_task_id=task.task_id)
             self._update_task_status(task.task_id, task_pb2.TaskStatus.TASK_STATUS_COMPLETED)
 
             processing_time = time.time() - start_time
@@ -52,8 +84,8 @@ class TaskHandler:
         except (ValueError, IOError) as e:
             raise e
         except Exception as e:
-            logging.error(f"Unerwarteter Fehler bei der Verarbeitung von Task {getattr(task, 'task_id', 'N/A')}: {e}", exc_info=True)
-            if task and task.task_id:
+            logging.error(f"Unerwarteter Fehler bei der Verarbeitung von Task {task.task_id or 'N/A'}: {e}", exc_info=True)
+            if task.task_id:
                 self._update_task_status(task.task_id, task_pb2.TaskStatus.TASK_STATUS_FAILED)
             raise IOError("Unbekannter interner Fehler") from e
 
@@ -66,6 +98,36 @@ class TaskHandler:
             return True
         return False
 
+    def _result_cache_key(self, task: task_pb2.Task) -> str:
+        """Liefert den Cache-Schlüssel des Tasks oder einen leeren String, wenn nicht gecacht wird."""
+        if self.result_cache is None:
+            return ""
+        if not is_cacheable(task):
+            logging.info(f"Task {task.task_id} ist vom Ergebnis-Cache ausgenommen.")
+            return ""
+        return task_fingerprint(task, namespace=self.agent_id)
+
+    def _log_decision(self, task_id: str, decision: str, reasoning: str, alternatives: tuple = ()):
+        """Protokolliert eine Entscheidung im DecisionLogStore, falls konfiguriert."""
+        if self.decision_log is None:
+            return
+        now = Timestamp()
+        now.GetCurrentTime()
+        entry = decision_log_pb2.DecisionLog(
+            # Deterministische ID: eine erneute Zustellung überschreibt den Eintrag statt ihn zu duplizieren.
+            decision_id=str(uuid.uuid5(uuid.NAMESPACE_URL, f"{task_id}/{self.agent_id}/{decision}")),
+            task_id=task_id,
+            logged_at=now,
+            creator_agent_id=self.agent_id,
+            decision=decision,
+            reasoning=reasoning,
+            alternatives_considered=list(alternatives),
+        )
+        try:
+            self.decision_log.append(entry)
+        except Exception as e:
+            logging.error(f"Konnte Entscheidung für Task {task_id} nicht protokollieren: {e}", exc_info=True)
+
     def _update_task_status(self, task_id: str, status: task_pb2.TaskStatus):
         """Aktualisiert den Status eines Tasks in Firestore."""
         try:
@@ -82,8 +144,18 @@ class TaskHandler:
         time.sleep(2)
         logging.info(f"Work on task {task_id} finished.")
 
-    def _create_and_publish_final_report(self, task_id: str):
-        """Erstellt, speichert und veröffentlicht einen Abschlussbericht."""
+    def _create_and_publish_final_report(self, task_id: str, template: final_report_pb2.FinalReport = None) -> final_report_pb2.FinalReport:
+        """
+        Erstellt, speichert und veröffentlicht einen Abschlussbericht.
+
+        Args:
+            task_id: Die ID des abgeschlossenen Tasks.
+            template: Optional eine Ergebnisvorlage aus dem Ergebnis-Cache, deren Status,
+                      Zusammenfassung und Ausgaben übernommen werden.
+
+        Returns:
+            Der veröffentlichte Abschlussbericht.
+        """
         report_id = str(uuid.uuid4())
         now = Timestamp()
         now.GetCurrentTime()
@@ -96,18 +168,18 @@ class TaskHandler:
             summary="SDA-BE has successfully completed the simulated task.",
             completion_timestamp=now
         )
+        if template is not None:
+            final_report.final_status = template.final_status
+            final_report.summary = template.summary
+            final_report.output_data_references.update(template.output_data_references)
 
         try:
-            report_dict = json_format.MessageToDict(final_report)
+            report_dict = message_to_firestore(final_report)
             self.db.collection("final_reports").document(report_id).set(report_dict)
             logging.info(f"FinalReport {report_id} for task {task_id} saved to Firestore.")
 
-            publish_proto_message_as_json(
-                publisher=self.publisher,
-                project_id=self.project_id,
-                topic_id=self.reports_topic,
-                proto_message=final_report
-            )
+            self.bus.publish(self.reports_topic, final_report)
         except Exception as e:
             logging.error(f"Fehler beim Speichern/Veröffentlichen des Berichts für Task {task_id}: {e}", exc_info=True)
             raise IOError("could not persist or publish final report") from e
+        return final_report
@@ -0,0 +1,94 @@
+import os
+import logging
+import threading
+
+from google.cloud import firestore
+from google.cloud import pubsub_v1
+from dotenv import load_dotenv
+
+from kiorga.utils.fastapi_factory import create_app
+from kiorga.utils.message_bus import PubSubBus
+from kiorga.utils.process_model import PerProcess, setup_cloud_logging
+from kiorga.utils.task_reaper import TaskReaper
+
+# Lädt die Umgebungsvariablen aus der .env-Datei im Root-Verzeichnis
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
+
+# === Logging-Konfiguration ===
+# Richtet das strukturierte Logging für Google Cloud ein.
+# Unter gunicorn erst im jeweiligen Worker (siehe setup_cloud_logging).
+setup_cloud_logging(log_level=logging.INFO)
+
+# === Globale Clients und Konfiguration ===
+try:
+    # gRPC-Clients sind nicht fork-sicher und werden daher erst im jeweiligen Worker erzeugt.
+    db = PerProcess(firestore.Client)
+    publisher = PerProcess(pubsub_v1.PublisherClient)
+
+    PROJECT_ID = os.environ["GCP_PROJECT"]
+    SDA_BE_TASKS_TOPIC = os.environ["TOPIC_SDA_BE_TASKS"]
+except KeyError as e:
+    raise EnvironmentError(f"Fehlende Umgebungsvariable: {e}") from e
+
+IN_PROGRESS_TIMEOUT_SECONDS = float(os.environ.get("IN_PROGRESS_TIMEOUT_SECONDS", "900"))
+REAPER_MAX_REQUEUES = int(os.environ.get("REAPER_MAX_REQUEUES", "2"))
+# Wartezeit auf den initialen Snapshot, bevor ein Tick als fehlgeschlagen gilt.
+INITIAL_SNAPSHOT_TIMEOUT_SECONDS = float(os.environ.get("INITIAL_SNAPSHOT_TIMEOUT_SECONDS", "60"))
+
+# Jeder Worker hätte einen eigenen Listener und Heap und würde überfällige Tasks
+# mehrfach delegieren. gunicorn.conf.py und uvicorn lesen beide WEB_CONCURRENCY.
+if os.environ.get("WEB_CONCURRENCY") != "1":
+    raise EnvironmentError(
+        f"Der Task-Reaper muss mit genau einem Worker laufen (WEB_CONCURRENCY=1), "
+        f"gesetzt ist: {os.environ.get('WEB_CONCURRENCY')!r}"
+    )
+
+
+class ReaperTickHandler:
+    """
+    Führt bei jedem Tick (Cloud Scheduler -> Pub/Sub-Push) einen Reaper-Lauf aus.
+
+    Der Snapshot-Listener wird beim ersten Tick im Worker-Prozess gestartet; der Heap
+    überlebt daher nur, solange der Prozess läuft, und wird bei einem Neustart aus dem
+    initialen Snapshot neu aufgebaut. Ein Tick wartet, bis dieser Snapshot verarbeitet
+    ist, und schlägt sonst fehl (Pub/Sub stellt ihn erneut zu). Der Service muss mit genau
+    einem Worker (erzwungen über WEB_CONCURRENCY=1) und höchstens einer Instanz betrieben
+    werden, damit Tasks nicht mehrfach erneut delegiert werden.
+    """
+
+    def __init__(self, reaper_factory):
+        self._reaper_factory = reaper_factory
+        self._reaper = None
+        self._lock = threading.Lock()
+
+    def _get_reaper(self) -> TaskReaper:
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = self._reaper_factory()
+                self._reaper.watch()
+            return self._reaper
+
+    def handle_tick(self, envelope: dict) -> None:
+        reaper = self._get_reaper()
+        if not reaper.wait_until_ready(INITIAL_SNAPSHOT_TIMEOUT_SECONDS):
+            raise IOError("initial snapshot of active tasks not received yet")
+        reaper.reap()
+
+
+# === Service-Layer Initialisierung ===
+tick_handler = ReaperTickHandler(
+    lambda: TaskReaper(
+        db_client=db,
+        bus=PubSubBus(publisher, PROJECT_ID),
+        requeue_topic=SDA_BE_TASKS_TOPIC,
+        in_progress_timeout=IN_PROGRESS_TIMEOUT_SECONDS,
+        max_requeues=REAPER_MAX_REQUEUES,
+    )
+)
+
+# === FastAPI-Anwendung über Factory erstellen ===
+app = create_app(service_handler=tick_handler, process_method_name="handle_tick")
+
+# Um die Anwendung zu starten, verwenden Sie (genau ein Worker):
+# WEB_CONCURRENCY=1 uvicorn main:app --host 0.0.0.0 --port 8080
+# Im Container: WEB_CONCURRENCY=1 setzen und max. eine Cloud-Run-Instanz zulassen.